@@ -0,0 +1,180 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+import parsers  # noqa: E402
+import schemas  # noqa: E402
+
+# Page type, fixture file and the schema its scraper runs
+PAGES = [
+    ("ranking", "ranking.html", schemas.RANKING),  # get_top_teams
+    ("team", "team.html", schemas.TEAM),  # get_team_date
+    ("results", "results.html", schemas.RESULTS),  # get_history
+    ("upcoming", "matches.html", schemas.UPCOMING),  # get_upcomming_matches
+    ("player", "player.html", schemas.PLAYER),  # get_player_data
+    ("player_stats", "player_stats.html", schemas.PLAYER_SUMMARY),  # get_player_stats
+    ("player_individual", "player_individual.html", schemas.INDIVIDUAL_STATS),
+]
+
+BACKENDS = ["html.parser", "lxml"]
+
+
+def available(backend):
+    return parsers.resolve_backend(backend) == backend
+
+
+# Team pages are extracted from the .teamProfile node, like scrape_team does
+def extract(schema, soup):
+    if schema is schemas.TEAM:
+        soup = soup.select_one(".teamProfile")
+    return schema.extract(soup)
+
+
+def parse(body, schema, backend, full):
+    classes = () if full else schema.parse_only
+    return parsers.parse(body, *classes, backend=backend)
+
+
+def timed(fn, iterations):
+    best = float("inf")
+    total = 0.0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+    return total / iterations, best
+
+
+# Peak traced memory and number of live allocations made by one parse + extract
+def memory(body, schema, backend, full):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    soup = parse(body, schema, backend, full)
+    extract(schema, soup)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return peak, allocations
+
+
+def bench_page(name, body, schema, backend, iterations, full):
+    soup = parse(body, schema, backend, full)
+    parse_mean, parse_best = timed(lambda: parse(body, schema, backend, full), iterations)
+    extract_mean, extract_best = timed(lambda: extract(schema, soup), iterations)
+    peak, allocations = memory(body, schema, backend, full)
+    return {
+        "page": name,
+        "backend": backend,
+        "strained": not full,
+        "bytes": len(body),
+        "parse_ms": parse_mean * 1000,
+        "parse_best_ms": parse_best * 1000,
+        "extract_ms": extract_mean * 1000,
+        "extract_best_ms": extract_best * 1000,
+        "peak_kb": peak / 1024,
+        "allocations": allocations,
+    }
+
+
+def print_table(results):
+    header = "{:<18} {:<12} {:>8} {:>10} {:>12} {:>10} {:>12}".format(
+        "page", "backend", "strained", "parse ms", "extract ms", "peak KiB", "allocations"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            "{:<18} {:<12} {:>8} {:>10.3f} {:>12.3f} {:>10.1f} {:>12}".format(
+                r["page"],
+                r["backend"],
+                "yes" if r["strained"] else "no",
+                r["parse_ms"],
+                r["extract_ms"],
+                r["peak_kb"],
+                r["allocations"],
+            )
+        )
+
+
+# Compare against a previous --json run, report pages slower than the threshold
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {
+            (r["page"], r["backend"], r["strained"]): r for r in json.load(f)
+        }
+    regressions = []
+    for r in results:
+        old = baseline.get((r["page"], r["backend"], r["strained"]))
+        if old is None:
+            continue
+        for metric in ("parse_best_ms", "extract_best_ms", "peak_kb"):
+            if old[metric] and r[metric] > old[metric] * (1 + threshold):
+                regressions.append(
+                    "{} [{}] {}: {:.3f} -> {:.3f}".format(
+                        r["page"], r["backend"], metric, old[metric], r[metric]
+                    )
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark HLTV scrapers against saved html fixtures"
+    )
+    parser.add_argument("--fixtures", default=os.path.join(HERE, "fixtures"))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--backend", action="append", choices=BACKENDS)
+    parser.add_argument("--page", action="append", choices=[p[0] for p in PAGES])
+    parser.add_argument(
+        "--full", action="store_true", help="parse whole pages, without strainers"
+    )
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json results to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%"
+    )
+    args = parser.parse_args()
+
+    backends = [b for b in (args.backend or BACKENDS) if available(b)]
+    results = []
+    for name, fixture, schema in PAGES:
+        if args.page and name not in args.page:
+            continue
+        path = os.path.join(args.fixtures, fixture)
+        if not os.path.exists(path):
+            print(f"skipping {name}, no fixture at {path}", file=sys.stderr)
+            continue
+        with open(path, encoding="utf-8") as f:
+            body = f.read()
+        for backend in backends:
+            results.append(
+                bench_page(name, body, schema, backend, args.iterations, args.full)
+            )
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
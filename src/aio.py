@@ -0,0 +1,327 @@
+import asyncio
+import contextvars
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+import archive
+import batch
+import cache
+import circuit
+import config
+import metrics
+import pages
+import parsepool
+import ratelimit
+import searchindex
+import upstream
+from errors import NotModified, ScrapeError, Unavailable, UpstreamError
+
+# Parsing is CPU bound, it runs here so the event loop keeps serving other requests
+parse_executor = ThreadPoolExecutor(
+    max_workers=config.AIO_PARSE_WORKERS, thread_name_prefix="aio-parse"
+)
+metrics.watch("aio-parse", parse_executor)
+
+# The sqlite tier and the archive block on disk, they run here instead of on the loop
+disk_executor = ThreadPoolExecutor(
+    max_workers=config.AIO_DISK_WORKERS, thread_name_prefix="aio-disk"
+)
+metrics.watch("aio-disk", disk_executor)
+
+session = None
+
+
+# Shared client, its connector pools keep-alive connections to hltv.org
+def client():
+    global session
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=config.AIO_POOL_SIZE, ttl_dns_cache=300
+            ),
+            headers={
+                "User-Agent": config.USER_AGENT,
+                "Accept-Encoding": upstream.ACCEPT_ENCODING,
+            },
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=config.UPSTREAM_CONNECT_TIMEOUT,
+                sock_read=config.UPSTREAM_READ_TIMEOUT,
+            ),
+        )
+    return session
+
+
+async def close():
+    if session is not None:
+        await session.close()
+
+
+async def offload(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(disk_executor, contextvars.copy_context().run, fn, *args)
+
+
+# cache.lookup, cache.put and cache.fresh, off the loop when they go to sqlite
+async def lookup(key):
+    if cache.disk is None:
+        return cache.lookup(key)
+    return await offload(cache.lookup, key)
+
+
+async def put(namespace, key, value, validators=None):
+    if cache.disk is None:
+        return cache.put(namespace, key, value, validators)
+    return await offload(cache.put, namespace, key, value, validators)
+
+
+async def fresh(namespace, *args):
+    if cache.disk is None:
+        return cache.fresh(namespace, *args)
+    return await offload(cache.fresh, namespace, *args)
+
+
+# Fetch an upstream url, returns the status and the decoded body. Like upstream.get,
+# a conditional fetch raises NotModified when the page hasn't changed, a 429/403
+# RateLimited and a 5xx UpstreamError.
+async def fetch(url, conditional=False):
+    url = upstream.absolute(url)
+    if config.UPSTREAM_MODE == "replay":
+        response = await offload(archive.replay, config.UPSTREAM_ARCHIVE, url)
+        return response.status_code, response.text
+
+    headers = upstream.conditions(url) if conditional and cache.revalidating.get() else {}
+    circuit.check(url)
+    await asyncio.sleep(ratelimit.reserve(url))
+    page = circuit.path(url)
+    try:
+        with metrics.upstream(page):
+            async with client().get(url, headers=headers) as response:
+                body = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        metrics.upstream_response(page, "error")
+        circuit.record(url, None, upstream.probe)
+        raise
+    metrics.upstream_response(page, response.status)
+    circuit.record(url, response.status, upstream.probe)
+    ratelimit.observe(url, response.status, response.headers)
+    if config.UPSTREAM_MODE == "record":
+        await offload(upstream.keep, url, response.status, response.headers, body)
+    else:
+        upstream.keep(url, response.status, response.headers, body)
+    if response.status == 304:
+        raise NotModified(url)
+    if response.status in ratelimit.BLOCKED:
+        raise ratelimit.blocked(response.status)
+    if response.status >= 500:
+        raise UpstreamError("hltv.org answered %d for %s" % (response.status, url), response.status)
+    return response.status, body.decode(response.get_encoding(), "replace")
+
+
+# Run a page parser off the event loop, in a worker process when the pool is enabled
+async def parse(fn, *args):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(parsepool.pool() or parse_executor, fn, *args)
+
+
+# Concurrent callers of the same key await one shared task. The task is shielded
+# so a cancelled caller doesn't cancel it for the others.
+inflight = {}
+
+
+async def coalesce(key, factory):
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+refreshing = set()
+
+
+# Async cache.load, inside the task running it
+async def load(namespace, key, fn, args, entry=None):
+    pages = {}
+    cache.revalidating.set(entry.validators if entry is not None else None)
+    cache.collected.set(pages)
+    try:
+        return await put(namespace, key, await fn(*args), pages)
+    except NotModified:
+        if entry is None:
+            raise
+        metrics.cache_event(namespace, "revalidated")
+        return await put(namespace, key, entry.value, entry.validators)
+
+
+async def refresh(namespace, key, fn, args, entry):
+    try:
+        await load(namespace, key, fn, args, entry)
+    except Exception:
+        # Keep serving the stale entry, the next request past it will retry
+        pass
+    finally:
+        refreshing.discard(key)
+
+
+# Async twin of cache.cached, sharing the same store and TTLs
+def cached(namespace):
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            if not config.CACHE_ENABLED:
+                return await fn(*args)
+
+            key = (namespace,) + args
+            entry = await lookup(key)
+            now = time.time()
+            if entry is not None and now < entry.fresh_until:
+                metrics.cache_event(namespace, "hit")
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                metrics.cache_event(namespace, "stale")
+                if key not in refreshing:
+                    refreshing.add(key)
+                    asyncio.ensure_future(refresh(namespace, key, fn, args, entry))
+                return entry.value
+
+            metrics.cache_event(namespace, "miss")
+            try:
+                return await coalesce(key, lambda: load(namespace, key, fn, args, entry))
+            except Unavailable:
+                if entry is None:
+                    raise
+                metrics.cache_event(namespace, "fallback")
+                return cache.fallback(entry)
+
+        wrapper.uncached = fn
+        wrapper.namespace = namespace
+        return wrapper
+
+    return decorator
+
+
+# Wait for a sub-fetch until the deadline, a slow or failing one yields default
+async def within(task, until, default=None):
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(task), max(0, until - time.monotonic())
+        )
+    except Exception:
+        task.cancel()
+        return default
+
+
+@cached("upcoming")
+async def get_upcomming_matches(team_id):
+    status, body = await fetch("/matches?team=" + team_id, conditional=True)
+    return await parse(pages.upcoming, body)
+
+
+@cached("results")
+async def get_history(team_id):
+    status, body = await fetch("/results?team=" + team_id, conditional=True)
+    return await parse(pages.results, body)
+
+
+@cached("news")
+async def scrape_news():
+    status, body = await fetch(config.RSS_URL + "/news", conditional=True)
+    return await parse(pages.news, body)
+
+
+async def search_term(term):
+    return await coalesce(("search", term), lambda: fetch_search(term))
+
+
+async def fetch_search(term):
+    status, body = await fetch("/search?term=" + term)
+    results = json.loads(body)
+    searchindex.index.learn(term, results)
+    return results
+
+
+@cached("ranking")
+async def scrape_ranking():
+    status, body = await fetch("/ranking/teams", conditional=True)
+    if status >= 400:
+        raise ScrapeError("%d Error for url: /ranking/teams" % status, status)
+    teams = await parse(pages.ranking, body)
+    searchindex.index.ranking(teams)
+    return teams
+
+
+@cached("team")
+async def scrape_team(team_id, keys=None):
+    status, body = await fetch("/team/" + team_id + "/_", conditional=True)
+    team = await parse(pages.team, body, team_id, keys)
+    searchindex.index.team(team)
+    return team
+
+
+@cached("player")
+async def scrape_player(player_id, keys=None):
+    status, body = await fetch("/player/" + player_id + "/_", conditional=True)
+    player = await parse(pages.player, body, player_id, keys)
+    searchindex.index.player(player)
+    return player
+
+
+async def get_individual_stats(player_id):
+    status, body = await fetch("/stats/players/individual/" + str(player_id) + "/_")
+    return await parse(pages.individual_stats, body)
+
+
+@cached("player_stats")
+async def scrape_player_stats(player_id, keys=None):
+    if keys is not None and "stats" not in keys:
+        status, body = await fetch("/stats/players/" + str(player_id) + "/_")
+        return await parse(pages.player_profile, body)
+
+    # Both stats pages are independent, fetch them concurrently
+    individual = asyncio.ensure_future(get_individual_stats(player_id))
+    try:
+        status, body = await fetch("/stats/players/" + str(player_id) + "/_")
+        summary = await parse(pages.player_summary, body)
+    except Exception:
+        individual.cancel()
+        if individual.done() and not individual.cancelled():
+            # Already failed too, its error is superseded by this one
+            individual.exception()
+        raise
+    return pages.player_stats(summary, await individual)
+
+
+# Async batch.run, at most BATCH_WORKERS items scraping at once, yields items as they finish
+async def each(fn, item_ids, timeout=None):
+    slots = asyncio.Semaphore(config.BATCH_WORKERS)
+
+    async def one(item_id):
+        async with slots:
+            try:
+                return batch.item(item_id, await fn(item_id))
+            except Exception as e:
+                return batch.item(item_id, error=e)
+
+    tasks = [asyncio.ensure_future(one(i)) for i in item_ids]
+    finished = set()
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=config.BATCH_TIMEOUT if timeout is None else timeout):
+            result = await next_done
+            finished.add(result["id"])
+            yield result
+    except asyncio.TimeoutError:
+        for item_id, task in zip(item_ids, tasks):
+            if item_id not in finished:
+                task.cancel()
+                yield batch.item(item_id, error="Timed out")
+
+
+# Every item of a batch, in the order the ids were asked
+async def collect(fn, item_ids, timeout=None):
+    items = {i["id"]: i async for i in each(fn, item_ids, timeout)}
+    return [items[i] for i in item_ids]
@@ -1,135 +1,178 @@
 import os
-import requests
-import re
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
-from flask import Flask, jsonify, request
+import time
 
+from flask import Flask, Response, g, jsonify, make_response, request
+from flask.json.provider import DefaultJSONProvider
+
+import batch
+import cache
 import config
+import fanout
+import fields
+import history
+import metrics
+import news
+import pages
+import parsepool
+import prefetch
+import profiler
+import schemas
+import searchindex
+import singleflight
+import stream
+import upstream
+from errors import ScrapeError
+
+
+# Route pattern of the current request, for metric labels
+def route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+# Time jsonify as the serialize stage of the route
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with metrics.stage("serialize", route()):
+            return super().response(*args, **kwargs)
+
 
 # Create Instance of Flask Server
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "changeme")
-app.config["JSON_SORT_KEYS"] = False
+app.json.sort_keys = False
+
+
+# One line per entity, written as each one is ready
+def ndjson(items):
+    return Response(stream.lines(items), mimetype=stream.MIMETYPE, headers=stream.HEADERS)
+
+
+# List payloads as JSON, or as NDJSON when the client accepts it
+def listing(items):
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(items)
+    return jsonify(items), 200
+
 
 # Function to get team upcoming matches
+@cache.cached("upcoming")
+@singleflight.coalesce("/matches?team={}")
 def get_upcomming_matches(team_id):
     # Fetch data for upcoming matches
-    headers = {"User-Agent": config.USER_AGENT}
-    response = requests.get(
-        config.BASE_URL + "/matches?team=" + team_id, headers=headers
-    )
-    body = response.text
-    soup = BeautifulSoup(body, "html.parser")
-    incoming_match = soup.select_one(".upcomingMatchesWrapper")
-
-    incoming_match_data = []
-    for match in incoming_match.select(".upcomingMatch"):
-        team2 = {
-            "name": match.select_one(".matchTeam.team2 .matchTeamName").text,
-            "logo": match.select_one(".matchTeam.team2 .matchTeamLogo")["src"],
-        }
+    response = upstream.get("/matches?team=" + team_id, conditional=True)
+    return parsepool.run(pages.upcoming, response.text)
+
+
+# Function to get team matches history
+@cache.cached("results")
+@singleflight.coalesce("/results?team={}")
+def get_history(team_id):
+    # Fetch data for results
+    response = upstream.get("/results?team=" + team_id, conditional=True)
+    return parsepool.run(pages.results, response.text)
 
-        # Opponent is always the other team
-        opponent = team2
 
-        incoming_match_data.append(
-            {
-                "id": int(match.select_one("a")["href"].split("/")[2]),
-                "opponent": opponent,
-                "tournament": {
-                    "name": match.select_one(".matchEvent .matchEventName").text,
-                    "logo": match.select_one(".matchEvent .matchEventLogo")["src"],
-                },
-                "type": match.select_one(".matchMeta").text,
-                "date": int(match.select_one(".matchTime").get("data-unix")),
-                "match_url": config.BASE_URL + match.select_one("a")["href"],
-            }
-        )
+# Function to get player individual statistics
+@singleflight.coalesce("/stats/players/individual/{}/_")
+def get_individual_stats(player_id):
+    response = upstream.get("/stats/players/individual/" + str(player_id) + "/_")
+    return parsepool.run(pages.individual_stats, response.text)
 
-    return incoming_match_data
 
+# Function to get news
+@cache.cached("news")
+@singleflight.coalesce(config.RSS_URL + "/news")
+def scrape_news():
+    res = upstream.get(config.RSS_URL + "/news", conditional=True)
+    return parsepool.run(pages.news, res.text)
 
-# Function to get team matches history
-def get_history(team_id):
 
-    # Fetch data for results
-    headers = {"User-Agent": config.USER_AGENT}
-    response = requests.get(
-        config.BASE_URL + "/results?team=" + team_id, headers=headers
-    )
-    body = response.text
-    soup = BeautifulSoup(body, "html.parser")
-    result_match = soup.select_one(".results-all")
-    res = []
-    for day in result_match.select(".results-sublist"):
-        for match in day.select_one(".result-con"):
-            team1 = {
-                "name": match.select_one(".team1 .team").text,
-                "logo": match.select_one(".team1 .team-logo")["src"],
-            }
-            team2 = {
-                "name": match.select_one(".team2 .team").text,
-                "logo": match.select_one(".team2 .team-logo")["src"],
-            }
-
-            # Check who won
-            winner = match.select_one(".team-won").text
-            result = "Victory" if winner == team1["name"] else "Defeat"
-
-            winner_score = match.select_one(".result-score .score-won").text
-            looser_score = match.select_one(".result-score .score-lost").text
-
-            score = (
-                winner_score + " - " + looser_score
-                if result == "Victory"
-                else looser_score + " - " + winner_score
-            )
-
-            opponent = team2
-
-            res.append(
-                {
-                    "id": int(match["href"].split("/")[2]),
-                    "result": result,
-                    "score": score,
-                    "opponent": opponent,
-                    "tournament": {
-                        "name": match.select_one(".event-name").text,
-                        "logo": match.select_one(".event-logo")["src"],
-                    },
-                    "type": match.select_one(".map-text").text,
-                    "match_url": config.BASE_URL + match["href"],
-                }
-            )
-
-    return res
-
-
-# Route to get news
-@app.route("/news", methods=["GET"])
-def get_news():
-    res = requests.get(config.RSS_URL + "/news")
-    xml = res.text
+@app.before_request
+def track_fallbacks():
+    cache.fallbacks.set([])
+    g.started = time.perf_counter()
+    g.profile = profiler.start(request.full_path, request.headers)
+    metrics.request_started()
+
+
+# Request metrics, errors that escaped a route are counted at teardown as 500s
+@app.after_request
+def count(response):
+    metrics.request_finished(route(), request.method, response.status_code, time.perf_counter() - g.started)
+    g.counted = True
+    if g.profile is not None:
+        response.headers["X-Profile-File"] = profiler.stop(g.profile)
+    return response
+
+
+@app.teardown_request
+def count_error(error):
+    if "started" in g and "counted" not in g:
+        metrics.request_finished(route(), request.method, 500, time.perf_counter() - g.started)
+        if g.profile is not None:
+            profiler.stop(g.profile)
 
-    if not xml.startswith("<?xml"):
-        return jsonify({"error": "Invalid XML"}), 400
 
-    root = ET.fromstring(xml)
-    rss = []
+# Mark responses built from expired cache entries, served while hltv.org is unavailable
+@app.after_request
+def mark_stale(response):
+    age = cache.staleness()
+    if age is not None:
+        response.headers["Age"] = str(age)
+        response.headers["X-Cache-Stale"] = "1"
+    return response
 
-    for item in root.findall("./channel/item"):
-        rss.append(
-            {
-                "title": item.find("./title").text,
-                "description": item.find("./description").text,
-                "link": item.find("./link").text,
-                "pub_date": item.find("./pubDate").text,
-            }
-        )
 
-    return jsonify(rss), 200
+# Strong ETag on JSON bodies, pollers sending it back get a 304 while it's unchanged
+@app.after_request
+def tag(response):
+    if response.status_code == 200 and response.is_json:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+# Route to get news, /news?since=<cursor> only returns the articles published after
+# the X-News-Cursor header of a previous call
+@app.route("/news", methods=["GET"])
+def get_news():
+    try:
+        if "since" not in request.args:
+            return listing(scrape_news())
+        since = news.cursor(request.args["since"])
+        news.feed.add(scrape_news())
+        entries = news.feed.since(since)
+        response = make_response(listing([item for _, item in entries]))
+        response.headers["X-News-Cursor"] = str(entries[0][0] if entries else since)
+        return response
+    except ScrapeError as e:
+        return jsonify({"error": str(e)}), e.status
+
+
+# Route to get new articles pushed as Server-Sent Events. Streams start from the
+# since argument or the Last-Event-ID of a reconnecting client, otherwise from now.
+# Each one holds a server thread until it closes, at most NEWS_MAX_STREAMS at once.
+@app.route("/news/stream", methods=["GET"])
+def stream_news():
+    try:
+        since = news.cursor(request.headers.get("Last-Event-ID", request.args.get("since")), news.feed.cursor)
+    except ScrapeError as e:
+        return jsonify({"error": str(e)}), e.status
+    if not news.streams.acquire(blocking=False):
+        return jsonify({"error": "Too many open news streams, poll /news?since= instead"}), 503
+    response = Response(news.events(since), mimetype=news.MIMETYPE, headers=news.HEADERS)
+    response.call_on_close(news.streams.release)
+    return response
+
+
+# Function to query hltv search
+@singleflight.coalesce("/search?term={}")
+def search_term(term):
+    results = upstream.get("/search?term=" + term).json()
+    searchindex.index.learn(term, results)
+    return results
 
 
 # Route to search a team or a player
@@ -137,737 +180,281 @@ def get_news():
 def search():
     # The query will be like this : /search?team=team_name or /search?player=player_name
     # First of all, we need to check if the query is for a team or a player
+    # Answers already in the search index don't go to hltv.org
 
     # If the query is for a team
     if "team" in request.args:
         try:
-            team_name = request.args["team"]
-            headers = {"User-Agent": config.USER_AGENT}
-            res = requests.get(
-                config.BASE_URL + "/search?term=" + team_name, headers=headers
-            )
-
-            res = res.json()[0]["teams"][0]
-
-            players = []
-            for player in res["players"]:
-                players.append(
-                    {
-                        "nickname": player["nickName"],
-                        "firstName": player["firstName"],
-                        "lastName": player["lastName"],
-                        "flag": player["flagUrl"],
-                        "hltv_url": config.BASE_URL + player["location"],
-                    }
-                )
-
-            return (
-                jsonify(
-                    {
-                        "id": res["id"],
-                        "name": res["name"],
-                        "logo": res["teamLogoDay"],
-                        "flag": res["flagUrl"],
-                        "hltv_url": config.BASE_URL + res["location"],
-                        "players": players,
-                    }
-                ),
-                200,
-            )
+            team = searchindex.index.find("team", request.args["team"])
+            if team is None:
+                team = pages.team_search(search_term(request.args["team"]))
+            return jsonify(team), 200
+        except ScrapeError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
         except Exception as e:
             return jsonify({"status": "error", "message": str(e)}), 500
     # If the query is for a player
     elif "player" in request.args:
         try:
-            player_nickname = request.args["player"]
-            headers = {"User-Agent": config.USER_AGENT}
-            res = requests.get(
-                config.BASE_URL + "/search?term=" + player_nickname, headers=headers
-            )
-
-            res = res.json()[0]["players"][0]
-
-            return (
-                jsonify(
-                    {
-                        "id": res["id"],
-                        "nickname": res["nickName"],
-                        "firstName": res["firstName"],
-                        "lastName": res["lastName"],
-                        "flag": res["flagUrl"],
-                        "picture": res["pictureUrl"],
-                        "hltv_url": config.BASE_URL + res["location"],
-                        "team": {
-                            "name": res["team"]["name"],
-                            "logo": res["team"]["teamLogoDay"],
-                            "hltv_url": config.BASE_URL + res["team"]["location"],
-                        },
-                    }
-                ),
-                200,
-            )
+            player = searchindex.index.find("player", request.args["player"])
+            if player is None:
+                player = pages.player_search(search_term(request.args["player"]))
+            return jsonify(player), 200
+        except ScrapeError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
         except Exception as e:
             return jsonify({"status": "error", "message": str(e)}), 500
     else:
         return jsonify({"status": "error", "message": "Invalid query"}), 400
 
 
+# Route to autocomplete team and player names, /search/autocomplete?term=vit&type=team.
+# Best ranked names first, hltv.org is only asked when nothing indexed matches.
+@app.route("/search/autocomplete", methods=["GET"])
+def autocomplete():
+    term = request.args.get("term", "")
+    try:
+        kind, limit = searchindex.options(request.args.get("type"), request.args.get("limit"))
+        names = searchindex.index.complete(term, kind, limit)
+        if not names and searchindex.normalize(term) and not searchindex.index.searched(term):
+            search_term(term)
+            names = searchindex.index.complete(term, kind, limit)
+        return listing(names)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Function to get top 30 teams
+@cache.cached("ranking")
+@singleflight.coalesce("/ranking/teams")
+def scrape_ranking():
+    response = upstream.get("/ranking/teams", conditional=True)
+    response.raise_for_status()
+    teams = parsepool.run(pages.ranking, response.text)
+    searchindex.index.ranking(teams)
+    return teams
+
+
 # Route to get top 30 teams
 @app.route("/ranking", methods=["GET"])
 def get_top_teams():
     try:
-        response = requests.get(
-            config.BASE_URL + "/ranking/teams",
-            headers={"User-Agent": config.USER_AGENT},
-        )
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        all_content = soup.select(".ranked-team")
-        teams = []
-
-        for element in all_content:
-            id = int(element.select_one(".moreLink")["href"].split("/")[2])
-            ranking = int(element.select_one(".position").text.replace("#", ""))
-            logo = element.select_one(".team-logo img")["src"]
-            name = element.select_one(".teamLine .name").text
-            players = []
-
-            for p in element.select(".player-holder"):
-                player = p.select_one("a")
-                pic = player.select_one(".playerPicture")
-                nickname = player.select_one(".nick").text
-
-                players.append(
-                    {
-                        "id": int(player["href"].split("/")[2]),
-                        "nickname": nickname,
-                        "fullname": player.select_one(".playerPicture")["alt"]
-                        .replace(f"'{nickname}'", "")
-                        .replace("  ", " "),
-                        "picture": player.select_one(".playerPicture")["src"],
-                        "hltv_url": config.BASE_URL + player["href"],
-                    }
-                )
-            teams.append(
-                {
-                    "id": id,
-                    "ranking": ranking,
-                    "name": name,
-                    "logo": logo,
-                    "players": players,
-                }
-            )
-
-        return jsonify(teams), 200
-
+        return listing(scrape_ranking())
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# Function to get team data
+@cache.cached("team")
+@singleflight.coalesce("/team/{}/_")
+def scrape_team(team_id, keys=None):
+    response = upstream.get("/team/" + team_id + "/_", conditional=True)
+    team = parsepool.run(pages.team, response.text, team_id, keys)
+    searchindex.index.team(team)
+    return team
+
+
+# Scrape only the keys of a field selection, unless the whole payload is fresh in cache
+def scrape_selected(scraper, namespace, item_id, keys):
+    if keys is None:
+        return scraper(item_id)
+    whole = cache.fresh(namespace, item_id)
+    return whole if whole is not None else scraper(item_id, keys)
+
+
+TEAM_FIELDS = ("id", *schemas.TEAM.fields, "matchs")
+
+
+# Team profile with its matches, raises ScrapeError when the team doesn't exist.
+# selection (see fields.parse) skips the extraction and pages it doesn't need.
+def team_payload(team_id, selection=None):
+    # Matches and results pages don't depend on the profile, fetch them alongside it
+    matchs = {}
+    if fields.wants(selection, "matchs", "incoming"):
+        matchs["incoming"] = fanout.submit(get_upcomming_matches, team_id)
+    if fields.wants(selection, "matchs", "results"):
+        matchs["results"] = fanout.submit(get_history, team_id)
+    until = fanout.deadline()
+
+    try:
+        team = scrape_selected(scrape_team, "team", team_id, fields.keys(selection, schemas.TEAM))
+    except ScrapeError:
+        for future in matchs.values():
+            future.cancel()
+        raise
+
+    # Cached payloads are shared, build the response in a new dict
+    payload = dict(
+        team,
+        # A sub-fetch past its deadline degrades to None instead of failing
+        matchs={key: fanout.result(future, until) for key, future in matchs.items()},
+    )
+    return fields.prune(payload, selection)
+
+
 # Route to get team data
 @app.route("/team/<string:team_id>", methods=["GET"])
 def get_team_date(team_id):
     try:
-        headers = {"User-Agent": config.USER_AGENT}
-        response = requests.get(
-            config.BASE_URL + "/team/" + team_id + "/_", headers=headers
-        )
-        body = response.text
-
-        soup = BeautifulSoup(body, "html.parser")
-        team_profile = soup.select_one(".teamProfile")
-
-        if not team_profile:
-            return (
-                jsonify(
-                    {
-                        "status": "error",
-                        "message": "There is no team available, something went wrong.",
-                    }
-                ),
-                404,
-            )
-
-        lineup = team_profile.select(".bodyshot-team > a")
-
-        players = []
-        for player in lineup:
-            country_name = player.select_one(".flag")["title"]
-            country_flag = f"{config.BASE_URL}{player.select_one('.flag')['src']}"
-            nickname = player["title"]
-            players.append(
-                {
-                    "id": int(player["href"].split("/")[2]),
-                    "fullname": player.select_one("img")["title"]
-                    .replace(f"'{nickname}'", "")
-                    .replace("  ", " "),
-                    "image": player.select_one("img")["src"],
-                    "nickname": player["title"],
-                    "country": {"name": country_name, "flag": country_flag}
-                    if country_name
-                    else None,
-                }
-            )
-
-        social_media = team_profile.select(".socialMediaButtons > a")
-        social = []
-        for media in social_media:
-            social.append(
-                {
-                    "name": media["href"].split(".")[1],
-                    "link": media["href"],
-                }
-            )
-
-        name = team_profile.select_one(".profile-team-name").text
-        logo = team_profile.select_one(".teamlogo")["src"]
-
-        stats_container = team_profile.select(".profile-team-stats-container > div")
-        ranking = int(stats_container[0].select_one(".right").text.replace("#", ""))
-        average_player_age = float(stats_container[2].select_one(".right").text)
-        coach = stats_container[3].select_one(".right").text.strip()
-
-        # Get map statistics
-        map_stats = {
-            "dust2": None,
-            "mirage": None,
-            "inferno": None,
-            "overpass": None,
-            "nuke": None,
-            "vertigo": None,
-            "ancient": None,
-            "anubis": None,
-        }
+        return jsonify(team_payload(team_id, fields.parse(request.args.get("fields"), TEAM_FIELDS))), 200
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        # Get team maps statistics
-        try:
-            maps_statistics = team_profile.select_one(".map-statistics")
-
-            i = 0
-            for maps in maps_statistics.select(".map-statistics-container"):
-                map_name = maps_statistics.select(".map-statistics-row-map-mapname")[
-                    i
-                ].text
-                map_stats[map_name.lower()] = float(
-                    maps.select_one(".map-statistics-row-win-percentage").text.split(
-                        "%"
-                    )[0]
-                )
-                i += 1
-        except:
-            map_stats = "[ERROR] No map statistics available..."
-
-        # Get team 5 last maps
-        try:
-            last_maps = team_profile.select_one(".last-5-matches")
-            last_5_maps = []
-
-            for maps in last_maps.select("a"):
-                opponent = maps.select_one(".highlighted-team-name").text
-                map_result = maps.select_one(".highlighted-match-status").text
-                last_5_maps.append(
-                    {
-                        "opponent": opponent,
-                        "result": map_result,
-                    }
-                )
-        except:
-            last_5_maps = "[ERROR] No last 5 maps available..."
-
-        # Get team upcomming matches
-        try:
-            upcomming = team_profile.select_one("#ongoingEvents")
-            events = upcomming.select_one(".upcoming-events-holder")
-            upcoming_events = []
-            for event in events.select("a"):
-                date = event.select("span[data-unix]")
-
-                # Managed events that start and end at the same date
-                try:
-                    start = int(date[0].get("data-unix"))
-                    end = int(date[1].get("data-unix"))
-                except:
-                    start = int(date[0].get("data-unix"))
-                    end = int(date[0].get("data-unix"))
-
-                upcoming_events.append(
-                    {
-                        "name": event.select_one(".eventbox-eventname").text,
-                        "logo": event.select_one(".eventbox-eventlogo").select_one(
-                            "img"
-                        )["src"],
-                        "date": {
-                            "start": start,
-                            "end": end,
-                        },
-                        "hltv_url": config.BASE_URL + event["href"],
-                    }
-                )
-        except Exception as e:
-            upcoming_events = []
 
-        # Get team trophies
-        try:
-            trophies = team_profile.select_one(".trophyRow")
-            trophies_data = []
-            for trophy in trophies.select("a"):
-                trophies_data.append(
-                    {
-                        "name": trophies.select_one(".trophyDescription")["title"],
-                        "logo": trophies.select_one(".trophyIcon")["src"],
-                        "hltv_url": config.BASE_URL + trophy["href"],
-                    }
-                )
-        except:
-            trophies_data = []
-
-        # Get team country
-        country = {
-            "name": team_profile.select_one(".team-country").text,
-            "flag": config.BASE_URL + team_profile.select_one(".flag")["src"],
-        }
+# Route to get several teams at once, /teams?ids=4494,6667
+@app.route("/teams", methods=["GET"])
+def get_teams():
+    try:
+        team_ids = batch.ids(request.args.get("ids"))
+        selection = fields.parse(request.args.get("fields"), TEAM_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
 
-        return (
-            jsonify(
-                {
-                    "id": int(team_id),
-                    "name": name,
-                    "logo": logo,
-                    "ranking": ranking,
-                    "country": country,
-                    "average_player_age": average_player_age,
-                    "coach": coach,
-                    "players": players,
-                    "stats": {
-                        "last_5_maps": last_5_maps,
-                        "past_3_months": map_stats,
-                    },
-                    "trophies": trophies_data,
-                    "social_media": social,
-                    "upcomming_events": upcoming_events,
-                    "matchs": {
-                        "incoming": get_upcomming_matches(team_id),
-                        "results": get_history(team_id),
-                    },
-                }
-            ),
-            200,
-        )
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    def scrape(team_id):
+        return team_payload(team_id, selection)
+
+    # Per team outcomes, one failing team doesn't fail the others. Streamed items
+    # come in the order they finish, JSON keeps the order of the ids.
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(batch.run(scrape, team_ids))
+    return jsonify(batch.collect(scrape, team_ids)), 200
 
 
 # Route to get team upcomming matches
 @app.route("/team/<string:team_id>/upcoming", methods=["GET"])
 def get_team_upcomming_matches(team_id):
     try:
-        return jsonify(get_upcomming_matches(team_id)), 200
+        return listing(get_upcomming_matches(team_id))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-# Route to get team result
+# Route to get team result, /team/4494/result?offset=100&limit=100 pages through
+# the whole history kept in the local store
 @app.route("/team/<string:team_id>/result", methods=["GET"])
 def get_team_result(team_id):
     try:
-        return jsonify(get_history(team_id)), 200
+        if "offset" in request.args or "limit" in request.args:
+            offset, limit = history.window(request.args.get("offset"), request.args.get("limit"))
+            return listing(history.results(team_id, offset, limit))
+        return listing(get_history(team_id))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# Function to get player data
+@cache.cached("player")
+@singleflight.coalesce("/player/{}/_")
+def scrape_player(player_id, keys=None):
+    response = upstream.get("/player/" + player_id + "/_", conditional=True)
+    player = parsepool.run(pages.player, response.text, player_id, keys)
+    searchindex.index.player(player)
+    return player
+
+
+PLAYER_FIELDS = ("id", *schemas.PLAYER.fields)
+
+
+def player_payload(player_id, selection=None):
+    player = scrape_selected(scrape_player, "player", player_id, fields.keys(selection, schemas.PLAYER))
+    return fields.prune(player, selection)
+
+
 # Route to get player data
 @app.route("/player/<string:player_id>", methods=["GET"])
 def get_player_data(player_id):
     try:
-        headers = {"User-Agent": config.USER_AGENT}
-        response = requests.get(
-            config.BASE_URL + "/player/" + player_id + "/_", headers=headers
-        )
-        body = response.text
+        return jsonify(player_payload(player_id, fields.parse(request.args.get("fields"), PLAYER_FIELDS)))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        soup = BeautifulSoup(body, "html.parser")
-        player_profile = soup.select_one(".playerProfile")
 
-        # Get basics informations
-        name = player_profile.select_one(".playerRealname").text.strip()
-        team = player_profile.select_one(".playerTeam")
+# Route to get several players at once, /players?ids=11893,7998
+@app.route("/players", methods=["GET"])
+def get_players():
+    try:
+        player_ids = batch.ids(request.args.get("ids"))
+        selection = fields.parse(request.args.get("fields"), PLAYER_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+
+    def scrape(player_id):
+        return player_payload(player_id, selection)
+
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(batch.run(scrape, player_ids))
+    return jsonify(batch.collect(scrape, player_ids)), 200
 
-        # Get all appearances in hltv top 20
-        try:
-            all_appearances = player_profile.select_one(".top20ListRight").find_all("a")
-            appearances = []
-            for appearance in all_appearances:
-                appearances.append(
-                    {
-                        "year": int(re.findall(r"\d{4}", appearance["href"])[1]),
-                        "positon": int(appearance.text.split("#")[0]),
-                        "news": config.BASE_URL + appearance["href"],
-                    }
-                )
-
-            top20 = all_appearances[-1]
-            top = {
-                "has_appeared": True if top20 is not None else False,
-                "last_appearance": {
-                    "year": int(re.findall(r"\d{4}", top20["href"])[1]),
-                    "positon": int(top20.text.split("#")[0]),
-                    "news": config.BASE_URL + top20["href"],
-                },
-                "all_appearances": appearances,
-            }
-        except:
-            top = {
-                "has_appeared": False,
-                "last_appearance": None,
-                "all_appearances": [],
-            }
-
-        # Check if the player is a major winner
-        try:
-            major = player_profile.select_one(".majorWinner").text
-            major_winner = {
-                "winner": True,
-                "champions": int(re.findall(r"\d{1}", major)[0]),
-            }
-        except:
-            major_winner = {"winner": False, "champions": None}
-
-        # General data about player and team
-        try:
-            stats = player_profile.select(".stat")
-            stats_data = []
-            for stat in stats:
-                stats_data.append(stat.text)
-
-            general_data = {
-                "numbers_teams": int(stats_data[0]),
-                "day_in_current_team": int(stats_data[1]),
-                "day_in_team": int(stats_data[2]),
-            }
-        except:
-            general_data = "error when getting general data"
-
-        # Get current team of the player
-        try:
-            current_team = None
-
-            team_element = player_profile.select_one(".team")
-            trophies = team_element.select_one(".trophy-row-trophy").select("a")
-            trophies_data = []
-            for trophy in trophies:
-                trophies_data.append(
-                    {
-                        "name": trophy.select_one("img")["title"],
-                        "trophy": config.BASE_URL + trophy.select_one("img")["src"],
-                        "event_url": config.BASE_URL + trophy["href"],
-                    }
-                )
-
-            current_team = {
-                "name": team_element.select_one(".team-name").text,
-                "logo": team_element.select_one(".team-logo")["src"],
-                "date": {
-                    "entrance": int(
-                        team_element.select_one(".time-period-cell")
-                        .select_one("span")
-                        .get("data-unix")
-                    ),
-                    "left": None,
-                },
-                "trophies": trophies_data,
-                "hltv_url": config.BASE_URL
-                + team_element.select_one(".team-name-cell").select_one("a")["href"],
-            }
-        except:
-            current_team = None
-
-        # Get former teams of the player
-        try:
-            former_teams = []
-            for team in player_profile.select(".past-team"):
-                date = team.select_one(".time-period-cell").select("span")
-                trophies = team.select_one(".trophy-row-trophy").select("a")
-                trophies_data = []
-                for trophy in trophies:
-                    trophies_data.append(
-                        {
-                            "name": trophy.select_one("img")["title"],
-                            "trophy": config.BASE_URL + trophy.select_one("img")["src"],
-                            "event_url": config.BASE_URL + trophy["href"],
-                        }
-                    )
-
-                former_teams.append(
-                    {
-                        "name": team.select_one(".team-name").text,
-                        "logo": team.select_one(".team-logo")["src"],
-                        "date": {
-                            "entrance": int(date[0].get("data-unix")),
-                            "left": int(date[1].get("data-unix")),
-                        },
-                        "trophies": trophies_data,
-                        "hltv_url": config.BASE_URL
-                        + team.select_one(".team-name-cell").select_one("a")["href"],
-                    }
-                )
-        except:
-            former_teams = "error when fetching former teams"
-
-        # Get trophies win by the player
-        trophies = {"trophies": [], "mvps": [], "htlv_top20": top}
-        try:
-            trophies_selector = player_profile.select_one("#Trophies")
-            trophies_element = trophies_selector.select(".trophy-detail")
-
-            for trophy in trophies_element:
-                trophyUrl = trophy.select_one("img")["src"]
-
-                # Check if the trophy is a valid url
-                if not trophyUrl.startswith("https://"):
-                    trophyUrl = config.BASE_URL + trophy.select_one("img")["src"]
-
-                trophies["trophies"].append(
-                    {
-                        "name": trophy.select_one(".trophy-event").text,
-                        "trophy": trophyUrl,
-                        "event_url": config.BASE_URL + trophy.select_one("a")["href"],
-                    }
-                )
-        except:
-            trophies["trophies"] = "error when fetching trophies"
-
-        # Get mvps win by the player
-        try:
-            mvps_selector = player_profile.select_one("#MVPs")
-            mvps_element = mvps_selector.select(".trophy-detail")
-
-            for mvp in mvps_element:
-                mvpUrl = mvp.select_one("img")["src"]
-
-                # Check if the trophy is a valid url
-                if not mvpUrl.startswith("https://"):
-                    mvpUrl = config.BASE_URL + mvp.select_one("img")["src"]
-
-                trophies["mvps"].append(
-                    {
-                        "name": mvp.select_one(".trophy-event").text,
-                        "trophy": mvpUrl,
-                        "event_url": config.BASE_URL + mvp.select_one("a")["href"],
-                    }
-                )
-        except:
-            trophies["mvps"] = "error when fetching mvps"
-
-        # Get basics statistics
-        stats = player_profile.select(".statsVal")
-        stats_data = []
-        for stats in stats:
-            stats_data.append(stats.text)
-
-        return jsonify(
-            {
-                "id": player_id,
-                "nickname": player_profile.select_one(".playerNickname").text,
-                "name": {
-                    # Attribut fullname has a space between firstname, we want to remove it
-                    "fullname": name,
-                    "firstname": name.split(" ")[0],
-                    "lastname": name.split(" ")[1],
-                },
-                "picture": player_profile.select_one(".bodyshot-img")["src"],
-                "age": int(
-                    re.findall(r"\d+", player_profile.select_one(".playerAge").text)[0]
-                ),
-                "flag": config.BASE_URL + player_profile.select_one(".flag")["src"],
-                "teams": {
-                    "general_data": general_data,
-                    "current_team": current_team,
-                    "former_teams": former_teams,
-                },
-                "trophies": trophies,
-                "stats": {
-                    "rating": float(stats_data[0]),
-                    "kills_per_round": float(stats_data[1]),
-                    "headshot_percentage": float(stats_data[2].split("%")[0]),
-                    "maps_played": int(stats_data[3]),
-                    "deaths_per_round": float(stats_data[4]),
-                    "rounds_contributed": float(stats_data[5].split("%")[0]),
-                },
-                "major_winner": major_winner,
-            }
-        )
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+
+# Function to get complete player statistics
+@cache.cached("player_stats")
+@singleflight.coalesce("/stats/players/{}/_")
+def scrape_player_stats(player_id, keys=None):
+    if keys is not None and "stats" not in keys:
+        # The profile alone is on the summary page
+        response = upstream.get("/stats/players/" + str(player_id) + "/_")
+        return parsepool.run(pages.player_profile, response.text)
+
+    # Both stats pages are independent, fetch the second one concurrently
+    individual = fanout.submit(get_individual_stats, player_id)
+
+    try:
+        response = upstream.get("/stats/players/" + str(player_id) + "/_")
+        summary = parsepool.run(pages.player_summary, response.text)
+    except Exception:
+        individual.cancel()
+        raise
+
+    # Merge the individual stats page fetched alongside this one
+    return pages.player_stats(summary, individual.result())
 
 
 # Route to get complete player statistics
 @app.route("/player/<int:player_id>/stats", methods=["GET"])
 def get_player_stats(player_id):
     try:
-        headers = {"User-Agent": config.USER_AGENT}
-        response = requests.get(
-            config.BASE_URL + "/stats/players/" + str(player_id) + "/_", headers=headers
-        )
-        body = response.text
-
-        soup = BeautifulSoup(body, "html.parser")
-        player_profile = soup.select_one(".playerSummaryStatBox")
-        stats_element = soup.select_one(".statistics")
-        stats_data = {}
-        for stats in stats_element.select(".stats-row"):
-            stats_data[stats.select("span")[0].text] = float(
-                stats.select("span")[1].text.split("%")[0]
-            )
-
-        for main_row in soup.select(".summaryStatBreakdownRow"):
-            for stats in main_row.select(".summaryStatBreakdown"):
-                if (
-                    stats.select_one(".summaryStatBreakdownSubHeader")
-                    .contents[0]
-                    .strip()
-                    == "KAST"
-                ):
-                    stats_data[
-                        stats.select_one(".summaryStatBreakdownSubHeader")
-                        .contents[0]
-                        .strip()
-                    ] = float(
-                        stats.select_one(".summaryStatBreakdownDataValue").text.split(
-                            "%"
-                        )[0]
-                    )
-                elif (
-                    stats.select_one(".summaryStatBreakdownSubHeader")
-                    .contents[0]
-                    .strip()
-                    == "Impact"
-                ):
-                    stats_data[
-                        stats.select_one(".summaryStatBreakdownSubHeader")
-                        .contents[0]
-                        .strip()
-                    ] = float(stats.select_one(".summaryStatBreakdownDataValue").text)
-
-        # Get player's shape
-        shape = []
-        shape_element = soup.select_one(".featured-ratings-container")
-        for element in shape_element.select(".rating-value"):
-            shape.append(float(element.text))
-
-        # Fetching new page for more stats
-        headers = {"User-Agent": config.USER_AGENT}
-        response = requests.get(
-            config.BASE_URL + "/stats/players/individual/" + str(player_id) + "/_",
-            headers=headers,
-        )
-        body = response.text
-
-        soup = BeautifulSoup(body, "html.parser")
-
-        for stats_box in soup.select(".columns .standard-box"):
-            for stats in stats_box.select(".stats-row"):
-                # Just to avoid errors on specific data, using 3 span
-                try:
-                    stats_data[stats.select("span")[0].text.strip()] = float(
-                        stats.select("span")[1].text.split("%")[0]
-                    )
-                except:
-                    pass
-
-        return jsonify(
-            {
-                "name": player_profile.select_one(".summaryNickname").text,
-                "fullname": player_profile.select_one(".summaryRealname").text.strip(),
-                "age": int(
-                    re.findall(
-                        r"\d+", player_profile.select_one(".summaryPlayerAge").text
-                    )[0]
-                ),
-                "flag": config.BASE_URL + player_profile.select_one(".flag")["src"],
-                "team": config.BASE_URL
-                + player_profile.select_one(".SummaryTeamname").select_one("a")["href"],
-                "stats": {
-                    "rating": stats_data["Rating 1.0"],
-                    "kast": stats_data["KAST"],
-                    "impact": stats_data["Impact"],
-                    "total_kills": stats_data["Total kills"],
-                    "headshot_percentage": stats_data["Headshot %"],
-                    "total_deaths": stats_data["Total deaths"],
-                    "k/d_ratio": stats_data["K/D Ratio"],
-                    "damage_per_round": stats_data["Damage / Round"],
-                    "grenae_damage_per_round": stats_data["Grenade dmg / Round"],
-                    "maps_played": stats_data["Maps played"],
-                    "rounds_played": stats_data["Rounds played"],
-                    "kills_per_round": stats_data["Kills / round"],
-                    "assists_per_round": stats_data["Assists / round"],
-                    "deaths_per_round": stats_data["Deaths / round"],
-                    "saved_by_teammates": stats_data["Saved by teammate / round"],
-                    "saved_teammates": stats_data["Saved teammates / round"],
-                    "featured_rating": {
-                        "vs_top_5": shape[0],
-                        "vs_top_10": shape[1],
-                        "vs_top_20": shape[2],
-                        "vs_top_30": shape[3],
-                        "vs_top_50": shape[4],
-                    },
-                    "rounds_stats": {
-                        "0_kill_per_rounds": stats_data["0 kill rounds"],
-                        "1_kill_per_rounds": stats_data["1 kill rounds"],
-                        "2_kill_per_rounds": stats_data["2 kill rounds"],
-                        "3_kill_per_rounds": stats_data["3 kill rounds"],
-                        "4_kill_per_rounds": stats_data["4 kill rounds"],
-                        "5_kill_per_rounds": stats_data["5 kill rounds"],
-                    },
-                    "opening_stats": {
-                        "total_opening_kills": stats_data["Total opening kills"],
-                        "total_opening_deaths": stats_data["Total opening deaths"],
-                        "opening_kill_ratio": stats_data["Opening kill ratio"],
-                        "opening_kill_rating": stats_data["Opening kill rating"],
-                        "win_percentage_after_opening_kill": stats_data[
-                            "Team win percent after first kill"
-                        ],
-                        "first_kill_won_per_round": stats_data[
-                            "First kill in won rounds"
-                        ],
-                    },
-                    "weapon_stats": {
-                        "rifles": stats_data["Rifle kills"],
-                        "snipers": stats_data["Sniper kills"],
-                        "smgs": stats_data["SMG kills"],
-                        "pistols": stats_data["Pistol kills"],
-                        "nades": stats_data["Grenade"],
-                        "other": stats_data["Other"],
-                    },
-                    "clutch_stats": {
-                        "1v1": {
-                            "wins": "",
-                            "losses": "",
-                        },
-                        "1v2": {
-                            "wins": "",
-                            "losses": "",
-                        },
-                        "1v3": {
-                            "wins": "",
-                            "losses": "",
-                        },
-                        "1v4": {
-                            "wins": "",
-                            "losses": "",
-                        },
-                        "1v5": {
-                            "wins": "",
-                            "losses": "",
-                        },
-                    },
-                },
-            }
-        )
+        selection = fields.parse(request.args.get("fields"), schemas.PLAYER_STATISTICS_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+
+    # Profile only selections share one entry, any stats need the whole payload
+    keys = None if fields.wants(selection, "stats") else ("profile",)
+    try:
+        stats = scrape_selected(scrape_player_stats, "player_stats", player_id, keys)
+        return jsonify(fields.prune(stats, selection))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
     except Exception as e:
-        raise e
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# Keep the ranked teams and their players warm before anyone asks for them, and
+# the news buffer filled
+prefetch.start(scrape_ranking, [scrape_team, get_upcomming_matches, get_history], scrape_player)
+news.start(scrape_news)
+
+
+# Route for prometheus to scrape
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    if not metrics.ENABLED:
+        return jsonify({"status": "error", "message": "Metrics are disabled"}), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 # Route for monitoring a container
 @app.route("/health", methods=["GET"])
 def healthcheck():
@@ -879,4 +466,4 @@ def healthcheck():
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=80, debug=True)
+    app.run(host="0.0.0.0", port=80, debug=config.DEBUG)
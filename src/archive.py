@@ -0,0 +1,70 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+# Headers describing the original transfer, the archived body is already decoded
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+# Archive entries are keyed on path and query so they replay against any host
+def key(url):
+    parts = urlsplit(url)
+    return parts.path + ("?" + parts.query if parts.query else "")
+
+
+def filename(directory, url):
+    return os.path.join(directory, hashlib.sha1(key(url).encode()).hexdigest() + ".json")
+
+
+def save(directory, url, status, headers, body):
+    os.makedirs(directory, exist_ok=True)
+    entry = {
+        "key": key(url),
+        "url": url,
+        "status": status,
+        "headers": {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in SKIPPED_HEADERS
+        },
+        "body": base64.b64encode(body).decode("ascii"),
+        "recorded_at": time.time(),
+    }
+    # Write then rename so concurrent readers never see a partial file
+    path = filename(directory, url)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+
+def load(directory, url):
+    try:
+        with open(filename(directory, url)) as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    entry["body"] = base64.b64decode(entry["body"])
+    return entry
+
+
+# Build a requests response from an archived entry, misses replay as 404
+def replay(directory, url):
+    entry = load(directory, url)
+    response = requests.Response()
+    response.url = url
+    if entry is None:
+        response.status_code = 404
+        response._content = b""
+        response.reason = "Not in archive"
+        return response
+    response.status_code = entry["status"]
+    response.headers.update(entry["headers"])
+    response._content = entry["body"]
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+    return response
@@ -0,0 +1,373 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from quart import Quart, Response, g, jsonify, make_response, request
+from quart.json.provider import DefaultJSONProvider
+
+import aio
+import batch
+import cache
+import config
+import fields
+import history
+import metrics
+import news
+import pages
+import parsepool
+import prefetch
+import schemas
+import searchindex
+import stream
+from errors import ScrapeError
+
+
+# Route pattern of the current request, for metric labels
+def route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+# Time jsonify as the serialize stage of the route
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with metrics.stage("serialize", route()):
+            return super().response(*args, **kwargs)
+
+
+# Async twin of app.py, served by uvicorn workers when SERVER_MODE=asgi
+app = Quart(__name__)
+app.json = TimedJSONProvider(app)
+
+app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "changeme")
+app.json.sort_keys = False
+
+
+# One line per entity, written as each one is ready
+def ndjson(items):
+    return Response(stream.alines(items), mimetype=stream.MIMETYPE, headers=stream.HEADERS)
+
+
+# List payloads as JSON, or as NDJSON when the client accepts it
+def listing(items):
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(items)
+    return jsonify(items), 200
+
+
+# One RSS poll, with the sqlite tier only one worker calls hltv.org
+async def poll_news():
+    key = ("news",)
+    if prefetch.leader():
+        return await asyncio.ensure_future(
+            aio.load("news", key, aio.scrape_news.uncached, (), await aio.lookup(key))
+        )
+    return await aio.scrape_news()
+
+
+@app.before_serving
+async def startup():
+    # Started first, so the poller thread of app.py stays off
+    news.start_async(poll_news)
+    if config.PREFETCH_ENABLED:
+        # The threaded scrapers of app.py fill the same cache, importing it starts them
+        import app as wsgi  # noqa: F401
+
+
+@app.after_serving
+async def shutdown():
+    prefetch.stop()
+    news.stop()
+    await aio.close()
+    parsepool.shutdown()
+
+
+@app.before_request
+async def track_fallbacks():
+    cache.fallbacks.set([])
+    g.started = time.perf_counter()
+    metrics.request_started()
+
+
+# Request metrics, errors that escaped a route are counted at teardown as 500s
+@app.after_request
+async def count(response):
+    metrics.request_finished(route(), request.method, response.status_code, time.perf_counter() - g.started)
+    g.counted = True
+    return response
+
+
+@app.teardown_request
+async def count_error(error):
+    if "started" in g and "counted" not in g:
+        metrics.request_finished(route(), request.method, 500, time.perf_counter() - g.started)
+
+
+# Mark responses built from expired cache entries, served while hltv.org is unavailable
+@app.after_request
+async def mark_stale(response):
+    age = cache.staleness()
+    if age is not None:
+        response.headers["Age"] = str(age)
+        response.headers["X-Cache-Stale"] = "1"
+    return response
+
+
+# Strong ETag on JSON bodies, pollers sending it back get a 304 while it's unchanged.
+# Hashed with sha1 like werkzeug (Quart uses md5), so both modes tag alike.
+@app.after_request
+async def tag(response):
+    if response.status_code == 200 and response.is_json:
+        response.set_etag(hashlib.sha1(await response.get_data()).hexdigest())
+        await response.make_conditional(request)
+    return response
+
+
+# Route to get news
+@app.route("/news", methods=["GET"])
+async def get_news():
+    try:
+        if "since" not in request.args:
+            return listing(await aio.scrape_news())
+        since = news.cursor(request.args["since"])
+        news.feed.add(await aio.scrape_news())
+        entries = news.feed.since(since)
+        response = await make_response(listing([item for _, item in entries]))
+        response.headers["X-News-Cursor"] = str(entries[0][0] if entries else since)
+        return response
+    except ScrapeError as e:
+        return jsonify({"error": str(e)}), e.status
+
+
+# Route to get new articles pushed as Server-Sent Events
+@app.route("/news/stream", methods=["GET"])
+async def stream_news():
+    try:
+        since = news.cursor(request.headers.get("Last-Event-ID", request.args.get("since")), news.feed.cursor)
+    except ScrapeError as e:
+        return jsonify({"error": str(e)}), e.status
+    response = Response(news.aevents(since), mimetype=news.MIMETYPE, headers=news.HEADERS)
+    # Streams stay open, past Quart's response timeout
+    response.timeout = None
+    return response
+
+
+# Route to search a team or a player
+@app.route("/search", methods=["GET"])
+async def search():
+    if "team" in request.args:
+        try:
+            team = searchindex.index.find("team", request.args["team"])
+            if team is None:
+                team = pages.team_search(await aio.search_term(request.args["team"]))
+            return jsonify(team), 200
+        except ScrapeError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+    elif "player" in request.args:
+        try:
+            player = searchindex.index.find("player", request.args["player"])
+            if player is None:
+                player = pages.player_search(await aio.search_term(request.args["player"]))
+            return jsonify(player), 200
+        except ScrapeError as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+    else:
+        return jsonify({"status": "error", "message": "Invalid query"}), 400
+
+
+# Route to autocomplete team and player names
+@app.route("/search/autocomplete", methods=["GET"])
+async def autocomplete():
+    term = request.args.get("term", "")
+    try:
+        kind, limit = searchindex.options(request.args.get("type"), request.args.get("limit"))
+        names = searchindex.index.complete(term, kind, limit)
+        if not names and searchindex.normalize(term) and not searchindex.index.searched(term):
+            await aio.search_term(term)
+            names = searchindex.index.complete(term, kind, limit)
+        return listing(names)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Route to get top 30 teams
+@app.route("/ranking", methods=["GET"])
+async def get_top_teams():
+    try:
+        return listing(await aio.scrape_ranking())
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Scrape only the keys of a field selection, unless the whole payload is fresh in cache
+async def scrape_selected(scraper, namespace, item_id, keys):
+    if keys is None:
+        return await scraper(item_id)
+    whole = await aio.fresh(namespace, item_id)
+    return whole if whole is not None else await scraper(item_id, keys)
+
+
+TEAM_FIELDS = ("id", *schemas.TEAM.fields, "matchs")
+
+
+# Team profile with its matches, raises ScrapeError when the team doesn't exist
+async def team_payload(team_id, selection=None):
+    matchs = {}
+    if fields.wants(selection, "matchs", "incoming"):
+        matchs["incoming"] = asyncio.ensure_future(aio.get_upcomming_matches(team_id))
+    if fields.wants(selection, "matchs", "results"):
+        matchs["results"] = asyncio.ensure_future(aio.get_history(team_id))
+    until = time.monotonic() + config.SUBFETCH_TIMEOUT
+
+    try:
+        team = await scrape_selected(aio.scrape_team, "team", team_id, fields.keys(selection, schemas.TEAM))
+    except ScrapeError:
+        for task in matchs.values():
+            task.cancel()
+        raise
+
+    payload = dict(
+        team,
+        matchs={key: await aio.within(task, until) for key, task in matchs.items()},
+    )
+    return fields.prune(payload, selection)
+
+
+# Route to get team data
+@app.route("/team/<string:team_id>", methods=["GET"])
+async def get_team_date(team_id):
+    try:
+        return jsonify(await team_payload(team_id, fields.parse(request.args.get("fields"), TEAM_FIELDS))), 200
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Route to get several teams at once, /teams?ids=4494,6667
+@app.route("/teams", methods=["GET"])
+async def get_teams():
+    try:
+        team_ids = batch.ids(request.args.get("ids"))
+        selection = fields.parse(request.args.get("fields"), TEAM_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+
+    async def scrape(team_id):
+        return await team_payload(team_id, selection)
+
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(aio.each(scrape, team_ids))
+    return jsonify(await aio.collect(scrape, team_ids)), 200
+
+
+# Route to get team upcomming matches
+@app.route("/team/<string:team_id>/upcoming", methods=["GET"])
+async def get_team_upcomming_matches(team_id):
+    try:
+        return listing(await aio.get_upcomming_matches(team_id))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Route to get team result, with offset or limit from the local history store. Its
+# crawl and store are blocking, they run off the event loop.
+@app.route("/team/<string:team_id>/result", methods=["GET"])
+async def get_team_result(team_id):
+    try:
+        if "offset" in request.args or "limit" in request.args:
+            offset, limit = history.window(request.args.get("offset"), request.args.get("limit"))
+            loop = asyncio.get_running_loop()
+            return listing(await loop.run_in_executor(None, history.results, team_id, offset, limit))
+        return listing(await aio.get_history(team_id))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+PLAYER_FIELDS = ("id", *schemas.PLAYER.fields)
+
+
+async def player_payload(player_id, selection=None):
+    player = await scrape_selected(aio.scrape_player, "player", player_id, fields.keys(selection, schemas.PLAYER))
+    return fields.prune(player, selection)
+
+
+# Route to get player data
+@app.route("/player/<string:player_id>", methods=["GET"])
+async def get_player_data(player_id):
+    try:
+        return jsonify(await player_payload(player_id, fields.parse(request.args.get("fields"), PLAYER_FIELDS)))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Route to get several players at once, /players?ids=11893,7998
+@app.route("/players", methods=["GET"])
+async def get_players():
+    try:
+        player_ids = batch.ids(request.args.get("ids"))
+        selection = fields.parse(request.args.get("fields"), PLAYER_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+
+    async def scrape(player_id):
+        return await player_payload(player_id, selection)
+
+    if stream.requested(request.accept_mimetypes):
+        return ndjson(aio.each(scrape, player_ids))
+    return jsonify(await aio.collect(scrape, player_ids)), 200
+
+
+# Route to get complete player statistics
+@app.route("/player/<int:player_id>/stats", methods=["GET"])
+async def get_player_stats(player_id):
+    try:
+        selection = fields.parse(request.args.get("fields"), schemas.PLAYER_STATISTICS_FIELDS)
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+
+    keys = None if fields.wants(selection, "stats") else ("profile",)
+    try:
+        stats = await scrape_selected(aio.scrape_player_stats, "player_stats", player_id, keys)
+        return jsonify(fields.prune(stats, selection))
+    except ScrapeError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Route for prometheus to scrape
+@app.route("/metrics", methods=["GET"])
+async def get_metrics():
+    if not metrics.ENABLED:
+        return jsonify({"status": "error", "message": "Metrics are disabled"}), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+# Route for monitoring a container
+@app.route("/health", methods=["GET"])
+async def healthcheck():
+    return jsonify(
+        {
+            "state": "running",
+        }
+    )
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=80, debug=config.DEBUG)
@@ -0,0 +1,79 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import metrics
+import profiler
+from errors import ScrapeError
+
+# Own pool, batch items fan out to the shared fanout pool themselves and must
+# not wait on it from inside it
+executor = ThreadPoolExecutor(
+    max_workers=config.BATCH_WORKERS, thread_name_prefix="batch"
+)
+metrics.watch("batch", executor)
+
+
+# Comma separated ids from the query string, duplicates dropped in order
+def ids(value):
+    unique = list(dict.fromkeys(i.strip() for i in (value or "").split(",") if i.strip()))
+    if not unique:
+        raise ScrapeError("Invalid query", 400)
+    if len(unique) > config.BATCH_MAX_IDS:
+        raise ScrapeError("Too many ids, at most %d per call" % config.BATCH_MAX_IDS, 400)
+    return unique
+
+
+# Outcome of one item, a payload or the error it failed with
+def item(item_id, payload=None, error=None):
+    if error is None:
+        return {"id": item_id, "status": "ok", "data": payload}
+    return {"id": item_id, "status": "error", "message": str(error)}
+
+
+# Run fn(id) for every id at bounded concurrency, yields items as they finish.
+# The pool is shared by every request, so an item's timeout starts when it begins
+# running rather than while it queues behind other batches. Items past it are
+# reported as timed out, and so are items that haven't started BATCH_QUEUE_TIMEOUT
+# seconds after the call, which are cancelled.
+def run(fn, item_ids, timeout=None):
+    timeout = config.BATCH_TIMEOUT if timeout is None else timeout
+    started = {}
+
+    def timed(item_id):
+        started[item_id] = time.monotonic()
+        return fn(item_id)
+
+    queued_until = time.monotonic() + config.BATCH_QUEUE_TIMEOUT
+    futures = {executor.submit(contextvars.copy_context().run, profiler.follow, timed, i): i for i in item_ids}
+    pending = set(futures)
+
+    while pending:
+        now = time.monotonic()
+        for future in [f for f in pending if futures[f] in started and started[futures[f]] + timeout <= now]:
+            pending.discard(future)
+            yield item(futures[future], error="Timed out")
+        if now >= queued_until:
+            # cancel() fails for items that started meanwhile, they keep their own timeout
+            for future in [f for f in pending if futures[f] not in started and f.cancel()]:
+                pending.discard(future)
+                yield item(futures[future], error="Timed out")
+
+        # Items not running yet can't time out before now + timeout
+        deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+        if now < queued_until:
+            deadlines.append(queued_until)
+        done, _ = wait(pending, min(deadlines, default=now + timeout) - now, FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            try:
+                yield item(futures[future], future.result())
+            except Exception as e:
+                yield item(futures[future], error=e)
+
+
+# Every item of a batch, in the order the ids were asked
+def collect(fn, item_ids, timeout=None):
+    items = {i["id"]: i for i in run(fn, item_ids, timeout)}
+    return [items[i] for i in item_ids]
@@ -0,0 +1,199 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+from errors import NotModified, Unavailable
+
+# validators maps the url of each page the value was built from to its (ETag,
+# Last-Modified), the conditions a reload of the entry is sent with
+Entry = namedtuple(
+    "Entry", ["value", "fetched_at", "fresh_until", "stale_until", "validators"], defaults=(None,)
+)
+
+
+# Size bounded LRU mapping, safe to share between threads
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+store = LRUCache(config.CACHE_MAX_ENTRIES)
+
+# Optional persistent tier behind the LRU, warm restarts are served from it
+disk = None
+if config.CACHE_BACKEND == "sqlite":
+    import sqlite_cache
+
+    disk = sqlite_cache.SQLiteStore(
+        config.CACHE_SQLITE_PATH, config.CACHE_SQLITE_RETENTION
+    )
+
+# Background refreshes of stale entries, keyed so one key refreshes at most once at a time
+refresher = ThreadPoolExecutor(
+    max_workers=config.CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+)
+metrics.watch("cache-refresh", refresher)
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+
+# Validators of the entry being reloaded, upstream requests are made conditional on
+# them and a 304 is answered with that entry's payload
+revalidating = contextvars.ContextVar("revalidating", default=None)
+
+# Validators of the pages downloaded while a value loads, kept in its entry
+collected = contextvars.ContextVar("collected", default=None)
+
+# Ages of the expired entries served in the current request. The apps set it per
+# request and mark their response stale when it isn't empty.
+fallbacks = contextvars.ContextVar("fallbacks", default=None)
+
+
+# Serve an expired entry in place of an unavailable upstream
+def fallback(entry):
+    served = fallbacks.get()
+    if served is not None:
+        served.append(time.time() - entry.fetched_at)
+    return entry.value
+
+
+# Age in seconds of the oldest expired entry served in this request, None if none was
+def staleness():
+    served = fallbacks.get()
+    return int(max(served)) if served else None
+
+
+# Look a key up in memory first, then in the persistent tier. An entry past its TTL
+# is looked up there too, another worker (the prefetch or news leader) may have
+# reloaded it since, sparing this one a call to hltv.org.
+def lookup(key):
+    entry = store.get(key)
+    if disk is not None and (entry is None or time.time() >= entry.fresh_until):
+        row = disk.get_payload(key)
+        if row is not None and (entry is None or row[1] > entry.fetched_at):
+            entry = Entry(*row)
+            store.set(key, entry)
+    return entry
+
+
+def save(key, entry):
+    store.set(key, entry)
+    if disk is not None:
+        disk.set_payload(key, *entry)
+
+
+# Value of an entry still within its TTL, None otherwise
+def fresh(namespace, *args):
+    entry = lookup((namespace,) + args)
+    if entry is not None and time.time() < entry.fresh_until:
+        return entry.value
+    return None
+
+
+# Store a value with the namespace TTLs
+def put(namespace, key, value, validators=None):
+    now = time.time()
+    ttl = config.CACHE_TTL[namespace]
+    stale = config.CACHE_STALE_TTL.get(namespace, 0)
+    save(key, Entry(value, now, now + ttl, now + ttl + stale, validators or None))
+    return value
+
+
+def load(namespace, key, fn, args, entry=None):
+    pages = {}
+    token = revalidating.set(entry.validators if entry is not None else None)
+    pages_token = collected.set(pages)
+    try:
+        return put(namespace, key, fn(*args), pages)
+    except NotModified:
+        if entry is None:
+            raise
+        # hltv.org still has the same page, keep the payload parsed from it
+        metrics.cache_event(namespace, "revalidated")
+        return put(namespace, key, entry.value, entry.validators)
+    finally:
+        collected.reset(pages_token)
+        revalidating.reset(token)
+
+
+def refresh(namespace, key, fn, args, entry):
+    try:
+        load(namespace, key, fn, args, entry)
+    except Exception:
+        # Keep serving the stale entry, the next request past it will retry
+        pass
+    finally:
+        with refreshing_lock:
+            refreshing.discard(key)
+
+
+def schedule_refresh(namespace, key, fn, args, entry):
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+    refresher.submit(refresh, namespace, key, fn, args, entry)
+
+
+# Cache the result of fn per arguments, serving stale entries while they refresh
+def cached(namespace):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            if not config.CACHE_ENABLED:
+                return fn(*args)
+
+            key = (namespace,) + args
+            entry = lookup(key)
+            now = time.time()
+            if entry is not None and now < entry.fresh_until:
+                metrics.cache_event(namespace, "hit")
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                metrics.cache_event(namespace, "stale")
+                schedule_refresh(namespace, key, fn, args, entry)
+                return entry.value
+            metrics.cache_event(namespace, "miss")
+            try:
+                return load(namespace, key, fn, args, entry)
+            except Unavailable:
+                # An expired entry still beats an error while hltv.org is throttled or down
+                if entry is None:
+                    raise
+                metrics.cache_event(namespace, "fallback")
+                return fallback(entry)
+
+        wrapper.uncached = fn
+        wrapper.namespace = namespace
+        return wrapper
+
+    return decorator
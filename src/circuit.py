@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import config
+from errors import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+
+# Breakers are per upstream path, its first segment (team, player, stats, results...)
+def path(url):
+    return urlsplit(url).path.strip("/").split("/")[0] or "/"
+
+
+# Opens after CIRCUIT_FAILURES errors in a row and fails calls fast while open.
+# Recovery is probed in the background, so no request waits on a dead upstream.
+class Breaker:
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def open(self):
+        return self.opened_at is not None
+
+    def check(self):
+        if self.opened_at is not None:
+            raise CircuitOpen("hltv.org /%s is unavailable, failing fast" % self.name, 503)
+
+    def success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.warning("hltv.org /%s recovered, closing its circuit", self.name)
+            self.failures = 0
+            self.opened_at = None
+
+    # Count a failure, opening the circuit and scheduling a probe of url on the last
+    # one allowed
+    def failure(self, url, probe):
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures < config.CIRCUIT_FAILURES:
+                return
+            self.opened_at = time.monotonic()
+        logger.warning(
+            "hltv.org /%s failed %d times in a row, opening its circuit",
+            self.name,
+            self.failures,
+        )
+        self.schedule(url, probe)
+
+    def schedule(self, url, probe):
+        timer = threading.Timer(config.CIRCUIT_COOLDOWN, self.probe, (url, probe))
+        timer.daemon = True
+        timer.start()
+
+    # Retry url in the background, close on success and wait another cooldown otherwise
+    def probe(self, url, probe):
+        try:
+            healthy = probe(url) < 500
+        except Exception:
+            healthy = False
+        if healthy:
+            self.success()
+        else:
+            self.schedule(url, probe)
+
+
+breakers = {}
+lock = threading.Lock()
+
+
+def breaker(url):
+    name = path(url)
+    with lock:
+        if name not in breakers:
+            breakers[name] = Breaker(name)
+        return breakers[name]
+
+
+def check(url):
+    if config.CIRCUIT_ENABLED:
+        breaker(url).check()
+
+
+# Record the outcome of a call to url, status None when it raised
+def record(url, status, probe):
+    if not config.CIRCUIT_ENABLED:
+        return
+    if status is None or status >= 500:
+        breaker(url).failure(url, probe)
+    else:
+        breaker(url).success()
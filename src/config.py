@@ -1,3 +1,149 @@
-BASE_URL = "https://www.hltv.org"
-RSS_URL = "https://www.hltv.org/rss"
+import os
+
+BASE_URL = os.environ.get("HLTV_BASE_URL", "https://www.hltv.org")
+RSS_URL = os.environ.get("HLTV_RSS_URL", BASE_URL + "/rss")
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
+
+# Upstream HTTP client (keep-alive pool shared by every fetch to hltv.org)
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", 20))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", 10))
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 1))
+
+# Concurrent fan-out of independent upstream fetches within one request
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", 16))
+SUBFETCH_TIMEOUT = float(os.environ.get("SUBFETCH_TIMEOUT", 8))
+
+# Batch endpoints (/teams, /players), items scraped at once, ids per call and deadline
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+BATCH_MAX_IDS = int(os.environ.get("BATCH_MAX_IDS", 200))
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 30))
+# Items still queued behind other batches this long after the call are dropped
+BATCH_QUEUE_TIMEOUT = float(os.environ.get("BATCH_QUEUE_TIMEOUT", 30))
+
+# In-memory response cache, TTLs in seconds per endpoint
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 2048))
+CACHE_REFRESH_WORKERS = int(os.environ.get("CACHE_REFRESH_WORKERS", 4))
+CACHE_TTL = {
+    "ranking": 6 * 3600,
+    "news": 3 * 60,
+    "team": 10 * 60,
+    "upcoming": 60,
+    "results": 10 * 60,
+    "player": 30 * 60,
+    "player_stats": 60 * 60,
+}
+# How long past its TTL an entry is still served while it refreshes in background
+CACHE_STALE_TTL = {
+    "ranking": 24 * 3600,
+    "news": 10 * 60,
+    "team": 60 * 60,
+    "upcoming": 5 * 60,
+    "results": 60 * 60,
+    "player": 6 * 3600,
+    "player_stats": 6 * 3600,
+}
+
+# Optional persistent cache tier, "memory" or "sqlite"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH", "cache.sqlite3")
+CACHE_SQLITE_RETENTION = int(os.environ.get("CACHE_SQLITE_RETENTION", 7 * 24 * 3600))
+
+# BeautifulSoup tree builder, "lxml" falls back to "html.parser" when not installed
+HTML_PARSER = os.environ.get("HTML_PARSER", "lxml")
+
+# Worker processes parsing pages off the GIL, 0 parses in the calling thread and
+# "auto" starts one per core
+PARSE_PROCESSES = os.environ.get("PARSE_PROCESSES", "0")
+PARSE_PROCESSES = os.cpu_count() if PARSE_PROCESSES == "auto" else int(PARSE_PROCESSES)
+
+# Upstream request budgets per path class, requests per second and burst. They
+# apply per server worker process.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMITS = {
+    "search": (0.5, 2),
+    "ranking": (0.2, 1),
+    "team": (2, 5),
+    "stats": (1, 3),
+    "rss": (0.2, 1),
+}
+# How long a request over budget queues before it's refused (or served from cache)
+RATE_LIMIT_WAIT = float(os.environ.get("RATE_LIMIT_WAIT", 5))
+# Pause after a 429/403 without Retry-After, doubled on each one in a row
+RATE_LIMIT_BACKOFF = float(os.environ.get("RATE_LIMIT_BACKOFF", 5))
+RATE_LIMIT_MAX_BACKOFF = float(os.environ.get("RATE_LIMIT_MAX_BACKOFF", 300))
+
+# Circuit breaker per upstream path, errors in a row before failing fast and seconds
+# between background probes while it's open
+CIRCUIT_ENABLED = os.environ.get("CIRCUIT_ENABLED", "1") == "1"
+CIRCUIT_FAILURES = int(os.environ.get("CIRCUIT_FAILURES", 5))
+CIRCUIT_COOLDOWN = float(os.environ.get("CIRCUIT_COOLDOWN", 30))
+
+# Prometheus metrics on /metrics, needs prometheus_client
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Per request profiles written to PROFILE_DIR, off when it's empty. Requests are
+# profiled when sent with a "X-Profile: 1" header or picked at PROFILE_RATE (0.01 = 1%),
+# sampling their stacks every PROFILE_INTERVAL seconds.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Profile")
+PROFILE_RATE = float(os.environ.get("PROFILE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+
+# Background prefetch of the ranking, ranked teams and their players, walked every
+# PREFETCH_INTERVAL seconds at most PREFETCH_RATE upstream pages per second
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "0") == "1"
+PREFETCH_INTERVAL = float(os.environ.get("PREFETCH_INTERVAL", 300))
+PREFETCH_RATE = float(os.environ.get("PREFETCH_RATE", 1))
+
+# Local store of team results history, crawled HISTORY_PAGE_SIZE results per page
+# (hltv.org's own page size) and at most HISTORY_MAX_PAGES pages per refresh
+HISTORY_PATH = os.environ.get("HISTORY_PATH", "history.sqlite3")
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGES = int(os.environ.get("HISTORY_MAX_PAGES", 10))
+# Seconds before newer results are looked for again
+HISTORY_TTL = float(os.environ.get("HISTORY_TTL", CACHE_TTL["results"]))
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", 500))
+
+# In-process search index fed by search answers, the ranking and team and player
+# pages. A search answer serves /search for SEARCH_TTL seconds, SEARCH_MAX_TERMS
+# terms are remembered, autocomplete returns SEARCH_COMPLETIONS names by default.
+SEARCH_TTL = float(os.environ.get("SEARCH_TTL", 3600))
+SEARCH_MAX_TERMS = int(os.environ.get("SEARCH_MAX_TERMS", 4096))
+SEARCH_COMPLETIONS = int(os.environ.get("SEARCH_COMPLETIONS", 10))
+SEARCH_MAX_COMPLETIONS = int(os.environ.get("SEARCH_MAX_COMPLETIONS", 50))
+
+# RSS feed polled every NEWS_INTERVAL seconds into a buffer of the NEWS_BUFFER latest
+# articles, served to /news?since= and the /news/stream event stream. Idle streams
+# get a keepalive comment every NEWS_KEEPALIVE seconds.
+NEWS_POLL_ENABLED = os.environ.get("NEWS_POLL_ENABLED", "1") == "1"
+NEWS_INTERVAL = float(os.environ.get("NEWS_INTERVAL", 60))
+NEWS_BUFFER = int(os.environ.get("NEWS_BUFFER", 500))
+NEWS_KEEPALIVE = float(os.environ.get("NEWS_KEEPALIVE", 15))
+# Open streams per threaded worker, each holds one of its threads. Streams past it
+# are refused with a 503, ASGI workers don't hold threads and take any number.
+NEWS_MAX_STREAMS = int(os.environ.get("NEWS_MAX_STREAMS", 4))
+
+# Upstream mode, "live", "record" (live and archive every response) or "replay"
+# (serve archived responses only, no network)
+UPSTREAM_MODE = os.environ.get("UPSTREAM_MODE", "live")
+UPSTREAM_ARCHIVE = os.environ.get("UPSTREAM_ARCHIVE", "archive")
+
+# Production server (gunicorn), threaded workers so one slow page only holds one thread
+SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:80")
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", (os.cpu_count() or 1) + 1))
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 16))
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 60))
+SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", 5))
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", 0))
+DEBUG = os.environ.get("FLASK_DEBUG", "0") == "1"
+
+# Async core (asgi.py), one event loop per worker multiplexing upstream waits
+AIO_POOL_SIZE = int(os.environ.get("AIO_POOL_SIZE", 100))
+AIO_PARSE_WORKERS = int(os.environ.get("AIO_PARSE_WORKERS", 4))
+# Threads running the blocking sqlite cache and archive reads and writes
+AIO_DISK_WORKERS = int(os.environ.get("AIO_DISK_WORKERS", 4))
+
+# "wsgi" serves app.py with threaded workers, "asgi" serves asgi.py with uvicorn workers
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
@@ -0,0 +1,47 @@
+# Raised by scrapers when a page can't be turned into a payload
+class ScrapeError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+    # Rebuilt with its status when it crosses a parse worker process boundary
+    def __reduce__(self):
+        return type(self), (str(self), self.status)
+
+
+# Raised by the extraction engine, path locates the failing field in the page schema
+class ExtractionError(Exception):
+    def __init__(self, path, message):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+        self.message = message
+
+    def __reduce__(self):
+        return type(self), (self.path, self.message)
+
+
+# Raised by a conditional upstream request answered 304, the cached payload parsed from
+# the same page is still current
+class NotModified(Exception):
+    pass
+
+
+# Raised instead of calling hltv.org when it can't be reached right now, the cached
+# scrapers answer it with their last payload
+class Unavailable(ScrapeError):
+    pass
+
+
+# The upstream budget is spent or we're backing off
+class RateLimited(Unavailable):
+    pass
+
+
+# The upstream path failed repeatedly and its circuit is open
+class CircuitOpen(Unavailable):
+    pass
+
+
+# hltv.org answered with a 5xx, status is the one it answered
+class UpstreamError(Unavailable):
+    pass
@@ -0,0 +1,167 @@
+import copy
+import logging
+
+import soupsieve
+
+from errors import ExtractionError
+
+logger = logging.getLogger(__name__)
+
+# Errors a converter or a post step may raise on unexpected page content
+CONVERSION_ERRORS = (ValueError, TypeError, IndexError, KeyError, AttributeError)
+
+
+# One value read from the page.
+#   selector  css selector relative to the current node, None for the node itself
+#   attr      attribute to read, None for the element text, or a callable(node)
+#   convert   callable applied to the raw value (int, float, ...)
+#   many      read every match into a list instead of the first one
+#   schema    nested Schema run on the matched node(s) instead of reading a value
+#   required  a missing or invalid required field fails the whole extraction,
+#             an optional one is replaced by default
+#   skip      with many, drop items that fail instead of failing the field
+class Field:
+    def __init__(
+        self,
+        selector=None,
+        attr=None,
+        convert=None,
+        many=False,
+        schema=None,
+        required=True,
+        default=None,
+        strip=False,
+        skip=False,
+    ):
+        self.selector = selector
+        self.matcher = soupsieve.compile(selector) if selector else None
+        self.attr = attr
+        self.convert = convert
+        self.many = many
+        self.schema = schema
+        self.required = required
+        self.default = default
+        self.strip = strip
+        self.skip = skip
+
+    # Fields of a schema sharing a selector resolve it once per node
+    def resolve(self, node, resolved):
+        if self.matcher is None:
+            return node
+        key = (self.selector, self.many)
+        if key not in resolved:
+            if self.many:
+                resolved[key] = self.matcher.select(node)
+            else:
+                resolved[key] = self.matcher.select_one(node)
+        return resolved[key]
+
+    def read(self, node, path):
+        if self.schema is not None:
+            return self.schema.run(node, path)
+
+        if self.attr is None:
+            raw = node.get_text()
+        elif callable(self.attr):
+            try:
+                raw = self.attr(node)
+            except CONVERSION_ERRORS as e:
+                raise ExtractionError(path, f"cannot read value: {e!r}")
+        else:
+            raw = node.get(self.attr)
+            if raw is None:
+                raise ExtractionError(path, f"missing attribute {self.attr!r}")
+
+        if self.strip:
+            raw = raw.strip()
+        if self.convert is not None:
+            try:
+                raw = self.convert(raw)
+            except CONVERSION_ERRORS as e:
+                raise ExtractionError(path, f"cannot convert {raw!r}: {e!r}")
+        return raw
+
+    def extract(self, node, path, resolved):
+        try:
+            target = self.resolve(node, resolved)
+            if not self.many:
+                if target is None:
+                    raise ExtractionError(path, f"no element matches {self.selector!r}")
+                return self.read(target, path)
+
+            values = []
+            for i, item in enumerate(target):
+                try:
+                    values.append(self.read(item, f"{path}[{i}]"))
+                except ExtractionError as e:
+                    if not self.skip:
+                        raise
+                    logger.debug("Skipped %s", e)
+            return values
+        except ExtractionError as e:
+            if self.required:
+                raise
+            logger.debug("Optional field fell back to its default, %s", e)
+            return copy.deepcopy(self.default)
+
+
+# A page (or part of a page) description, compiled once at import.
+#   fields  mapping of output key to Field, extracted in order
+#   root    css selector of the node the fields are relative to
+#   post    callable reshaping the extracted dict into the final payload
+#   parse_only  classes of the page containers the schema reads, used to only
+#               build those subtrees when parsing (see parsers.parse)
+class Schema:
+    def __init__(self, fields, root=None, post=None, name="page", parse_only=()):
+        self.fields = fields
+        self.parse_only = parse_only
+        self.root = root
+        self.root_matcher = soupsieve.compile(root) if root else None
+        self.post = post
+        self.name = name
+        self.selections = {}
+
+    def extract(self, node):
+        return self.run(node, self.name)
+
+    # Same schema reading only the given keys, post steps expect every field so the
+    # selection is returned as extracted
+    def select(self, keys):
+        keys = tuple(key for key in self.fields if key in keys)
+        if keys not in self.selections:
+            self.selections[keys] = Schema(
+                {key: self.fields[key] for key in keys},
+                root=self.root,
+                name=self.name,
+                parse_only=self.parse_only,
+            )
+        return self.selections[keys]
+
+    def run(self, node, path):
+        if self.root_matcher is not None:
+            node = self.root_matcher.select_one(node)
+            if node is None:
+                raise ExtractionError(path, f"no element matches {self.root!r}")
+
+        resolved = {}
+        data = {}
+        for key, field in self.fields.items():
+            data[key] = field.extract(node, f"{path}.{key}", resolved)
+
+        if self.post is None:
+            return data
+        try:
+            return self.post(data)
+        except CONVERSION_ERRORS as e:
+            raise ExtractionError(path, f"invalid content: {e!r}")
+
+
+# Schema returning the list of items found inside a required container
+def listing(container, item, schema=None, name="page", parse_only=(), **kwargs):
+    return Schema(
+        {"items": Field(item, many=True, schema=schema, **kwargs)},
+        root=container,
+        post=lambda data: data["items"],
+        name=name,
+        parse_only=parse_only,
+    )
@@ -0,0 +1,34 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+import profiler
+
+# Bounded pool shared by every request that fans out to several upstream pages
+executor = ThreadPoolExecutor(
+    max_workers=config.FANOUT_WORKERS, thread_name_prefix="fanout"
+)
+metrics.watch("fanout", executor)
+
+
+# Schedule fn(*args) on the shared pool, in the caller's context
+def submit(fn, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, profiler.follow, fn, *args, **kwargs)
+
+
+# Absolute deadline for sub-fetches started now
+def deadline(timeout=None):
+    return time.monotonic() + (
+        config.SUBFETCH_TIMEOUT if timeout is None else timeout
+    )
+
+
+# Wait for a sub-fetch until the deadline, a slow or failing one yields default
+def result(future, until, default=None):
+    try:
+        return future.result(timeout=max(0, until - time.monotonic()))
+    except Exception:
+        future.cancel()
+        return default
@@ -0,0 +1,55 @@
+from errors import ScrapeError
+
+# Field selection, ?fields=name,players.nickname,matchs.incoming keeps only those keys
+# of a payload. A selection maps each requested key to the selection of its own
+# keys, or None to keep the whole value.
+
+
+def parse(value, allowed):
+    if not value:
+        return None
+
+    selection = {}
+    for path in value.split(","):
+        keys = [key.strip() for key in path.split(".")]
+        if keys[0] not in allowed:
+            raise ScrapeError("Unknown field " + keys[0], 400)
+
+        node = selection
+        for i, key in enumerate(keys):
+            if i == len(keys) - 1 or node.get(key, {}) is None:
+                # The key is selected whole, deeper paths under it are moot
+                node[key] = None
+                break
+            node = node.setdefault(key, {})
+    return selection
+
+
+# Top level keys of a schema to extract, sorted so equal selections share cache entries
+def keys(selection, schema):
+    if selection is None:
+        return None
+    return tuple(sorted(key for key in selection if key in schema.fields))
+
+
+# Whether the value at a path of keys is selected, in whole or in part
+def wants(selection, *path):
+    for key in path:
+        if selection is None:
+            return True
+        if key not in selection:
+            return False
+        selection = selection[key]
+    return True
+
+
+def prune(payload, selection):
+    if selection is None:
+        return payload
+    if isinstance(payload, list):
+        return [prune(item, selection) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    return {
+        key: prune(payload[key], selection[key]) for key in payload if key in selection
+    }
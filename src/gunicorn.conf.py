@@ -0,0 +1,50 @@
+import os
+import shutil
+
+# gunicorn reads every top level name as a setting, and "config" is one of them
+import config as api_config
+
+# gunicorn -c gunicorn.conf.py
+bind = api_config.SERVER_BIND
+if api_config.SERVER_MODE == "asgi":
+    # One event loop per worker, threads don't apply
+    wsgi_app = "asgi:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+    worker_class = "gthread"
+workers = api_config.SERVER_WORKERS
+threads = api_config.SERVER_THREADS
+timeout = api_config.SERVER_TIMEOUT
+graceful_timeout = api_config.SERVER_TIMEOUT
+keepalive = api_config.SERVER_KEEPALIVE
+
+# Recycle workers after this many requests, 0 disables it
+max_requests = api_config.SERVER_MAX_REQUESTS
+max_requests_jitter = api_config.SERVER_MAX_REQUESTS // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+# Stop the parse worker processes along with the worker that started them
+def worker_exit(server, worker):
+    import parsepool
+
+    parsepool.shutdown()
+
+
+# Workers share their metrics through PROMETHEUS_MULTIPROC_DIR, start it empty
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+# Drop the live gauges of a worker that exited
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,237 @@
+import json
+import logging
+import sqlite3
+import time
+
+import config
+import pages
+import parsepool
+import singleflight
+import upstream
+from errors import ScrapeError, Unavailable
+from sqlite_cache import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    team_id TEXT NOT NULL,
+    match_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (team_id, match_id)
+);
+CREATE INDEX IF NOT EXISTS matches_seq ON matches (team_id, seq);
+CREATE TABLE IF NOT EXISTS crawls (
+    team_id TEXT PRIMARY KEY,
+    complete INTEGER NOT NULL,
+    crawled_at REAL NOT NULL
+);
+"""
+
+
+# Local store of each team's results history. seq orders a team's matches, the
+# newest has the highest, so new results stack on top and backfilled ones below.
+# The database is opened on first use. Disk errors are logged and treated as an
+# empty history so they never fail a crawl, only reading a page of it does.
+class HistoryStore(SQLiteDatabase):
+    # Each thread's connection makes sure the tables exist when it opens
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = super().connection()
+        try:
+            conn.executescript(SCHEMA)
+            conn.commit()
+        except sqlite3.Error:
+            self.local.conn = None
+            conn.close()
+            raise
+        return conn
+
+    def state(self, team_id):
+        try:
+            row = (
+                self.connection()
+                .execute("SELECT complete, crawled_at FROM crawls WHERE team_id = ?", (team_id,))
+                .fetchone()
+            )
+        except sqlite3.Error:
+            logger.exception("Results history read failed")
+            return None
+        return None if row is None else (bool(row[0]), row[1])
+
+    def mark(self, team_id, complete, crawled_at):
+        try:
+            conn = self.connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO crawls (team_id, complete, crawled_at) VALUES (?, ?, ?)",
+                (team_id, int(complete), crawled_at),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            logger.exception("Results history write failed")
+
+    def known(self, team_id, match_ids):
+        if not match_ids:
+            return set()
+        try:
+            rows = self.connection().execute(
+                "SELECT match_id FROM matches WHERE team_id = ? AND match_id IN (%s)"
+                % ",".join("?" * len(match_ids)),
+                (team_id, *match_ids),
+            )
+            return {row[0] for row in rows}
+        except sqlite3.Error:
+            logger.exception("Results history read failed")
+            return set()
+
+    def count(self, team_id):
+        try:
+            return (
+                self.connection()
+                .execute("SELECT COUNT(*) FROM matches WHERE team_id = ?", (team_id,))
+                .fetchone()[0]
+            )
+        except sqlite3.Error:
+            logger.exception("Results history read failed")
+            return 0
+
+    # Store matches given newest first, above the stored ones when newer and below
+    # them otherwise
+    def add(self, team_id, matches, newer):
+        try:
+            conn = self.connection()
+            top, bottom = conn.execute(
+                "SELECT MAX(seq), MIN(seq) FROM matches WHERE team_id = ?", (team_id,)
+            ).fetchone()
+            if top is None:
+                start = len(matches)
+            elif newer:
+                start = top + len(matches)
+            else:
+                start = bottom - 1
+            conn.executemany(
+                "INSERT OR IGNORE INTO matches (team_id, match_id, seq, payload) VALUES (?, ?, ?, ?)",
+                [
+                    (team_id, match["id"], start - i, json.dumps(match))
+                    for i, match in enumerate(matches)
+                ],
+            )
+            conn.commit()
+        except sqlite3.Error:
+            logger.exception("Results history write failed")
+
+    def page(self, team_id, offset, limit):
+        try:
+            rows = self.connection().execute(
+                "SELECT payload FROM matches WHERE team_id = ? ORDER BY seq DESC LIMIT ? OFFSET ?",
+                (team_id, limit, offset),
+            )
+            return [json.loads(row[0]) for row in rows]
+        except sqlite3.Error:
+            logger.exception("Results history read failed")
+            raise ScrapeError("The results history is unavailable", 503)
+
+
+store = HistoryStore(config.HISTORY_PATH)
+
+
+# One page of a team's results, newest first
+def fetch(team_id, offset):
+    if offset == 0:
+        response = upstream.get("/results?team=" + team_id)
+    else:
+        response = upstream.get("/results?offset=" + str(offset) + "&team=" + team_id)
+    return parsepool.run(pages.results, response.text)
+
+
+# offset and limit query arguments, raises ScrapeError when they aren't valid
+def window(offset, limit):
+    try:
+        offset = int(offset or 0)
+        limit = int(limit or config.HISTORY_PAGE_SIZE)
+    except ValueError:
+        raise ScrapeError("offset and limit must be integers", 400)
+    if offset < 0 or not 0 < limit <= config.HISTORY_MAX_LIMIT:
+        raise ScrapeError("limit must be between 1 and %d" % config.HISTORY_MAX_LIMIT, 400)
+    return offset, limit
+
+
+# Read results pages from offset on, up to the first stored match or the end of the
+# history. Returns the new matches, newest first, and whether the end was reached.
+def crawl(team_id, offset, pages):
+    found = []
+    for _ in range(pages):
+        page = fetch(team_id, offset)
+        known = store.known(team_id, [match["id"] for match in page])
+        for match in page:
+            if match["id"] in known:
+                return found, False
+            found.append(match)
+        if len(page) < config.HISTORY_PAGE_SIZE:
+            return found, True
+        offset += len(page)
+    return found, False
+
+
+# Pages needed to read count more matches, within the refresh budget
+def budget(count):
+    return max(1, min(config.HISTORY_MAX_PAGES, -(-count // config.HISTORY_PAGE_SIZE)))
+
+
+# Bring a team's history up to date and at least depth matches deep. New results
+# are read down to the first known match, then the rest of a history not yet
+# complete is backfilled as deep as needed.
+def update(team_id, depth=0):
+    state = store.state(team_id)
+    complete = state is not None and state[0]
+    crawled_at = state[1] if state is not None else None
+    if state is None or time.time() - crawled_at >= config.HISTORY_TTL:
+        crawled_at = time.time()
+        pages = config.HISTORY_MAX_PAGES if state is not None else budget(depth)
+        newer, end = crawl(team_id, 0, pages)
+        if state is not None and len(newer) == pages * config.HISTORY_PAGE_SIZE:
+            logger.warning("Results of team %s past %d new matches are missing", team_id, len(newer))
+        store.add(team_id, newer, newer=True)
+        complete = complete or end
+
+    count = store.count(team_id)
+    if not complete and count < depth:
+        older, complete = backfill(team_id, count, budget(depth - count))
+        store.add(team_id, older, newer=False)
+    store.mark(team_id, complete, crawled_at)
+
+
+# Matches older than the stored ones, from offset on. Known matches are skipped, so
+# the offset only needs to be about right.
+def backfill(team_id, offset, pages):
+    found = []
+    for _ in range(pages):
+        page = fetch(team_id, offset)
+        known = store.known(team_id, [match["id"] for match in page])
+        found += [match for match in page if match["id"] not in known]
+        if len(page) < config.HISTORY_PAGE_SIZE:
+            return found, True
+        offset += len(page)
+    return found, False
+
+
+# Results of a team from offset, newest first, served from the local store. While
+# hltv.org is unavailable the stored history is served as it is.
+def results(team_id, offset, limit):
+    depth = offset + limit
+    try:
+        for _ in range(2):
+            singleflight.group.do(("history", team_id), update, team_id, depth)
+            # Joining a shallower crawl of another request can leave the history short
+            # of this one, crawl again then
+            state = store.state(team_id)
+            if (state is not None and state[0]) or store.count(team_id) >= depth:
+                break
+    except Unavailable as e:
+        if not store.count(team_id):
+            raise
+        logger.warning("Serving stored results of team %s: %s", team_id, e)
+    return store.page(team_id, offset, limit)
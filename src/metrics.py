@@ -0,0 +1,125 @@
+import contextlib
+import os
+import time
+
+import config
+
+# Prometheus metrics, left out when prometheus_client isn't installed or
+# METRICS_ENABLED=0, every helper below is then a no-op
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+ENABLED = config.METRICS_ENABLED and prometheus_client is not None
+
+# Thread pools sampled for saturation, name -> executor
+pools = {}
+
+if ENABLED:
+    # gunicorn runs several workers, they share their samples through this directory
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    REQUEST_SECONDS = Histogram(
+        "hltv_api_request_seconds", "Time spent handling a request", ["route", "method"]
+    )
+    RESPONSES = Counter(
+        "hltv_api_responses_total", "Responses sent", ["route", "method", "status"]
+    )
+    IN_FLIGHT = Gauge(
+        "hltv_api_requests_in_flight", "Requests being handled", multiprocess_mode="livesum"
+    )
+    STAGE_SECONDS = Histogram(
+        "hltv_api_stage_seconds",
+        "Time spent per stage: upstream fetch, parse, extract and serialize",
+        ["stage", "page"],
+    )
+    UPSTREAM_RESPONSES = Counter(
+        "hltv_api_upstream_responses_total", "hltv.org answers by status", ["path", "status"]
+    )
+    UPSTREAM_IN_FLIGHT = Gauge(
+        "hltv_api_upstream_in_flight", "Requests waiting on hltv.org", multiprocess_mode="livesum"
+    )
+    CACHE = Counter(
+        "hltv_api_cache_total",
+        "Cache lookups by outcome: hit, stale, miss, fallback and revalidated",
+        ["namespace", "result"],
+    )
+    POOL_QUEUED = Gauge(
+        "hltv_api_pool_queued", "Tasks waiting for a pool worker", ["pool"], multiprocess_mode="livesum"
+    )
+    POOL_WORKERS = Gauge(
+        "hltv_api_pool_workers", "Threads started by a pool", ["pool"], multiprocess_mode="livesum"
+    )
+
+
+# Time a stage of the pipeline for one kind of page
+@contextlib.contextmanager
+def stage(name, page):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name, page).observe(time.perf_counter() - started)
+
+
+# Time an upstream call, counting it in flight while it waits
+@contextlib.contextmanager
+def upstream(page):
+    if not ENABLED:
+        yield
+        return
+    UPSTREAM_IN_FLIGHT.inc()
+    try:
+        with stage("fetch", page):
+            yield
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+
+
+# Status "error" counts calls that got no answer at all
+def upstream_response(page, status):
+    if ENABLED:
+        UPSTREAM_RESPONSES.labels(page, str(status)).inc()
+
+
+def cache_event(namespace, result):
+    if ENABLED:
+        CACHE.labels(namespace, result).inc()
+
+
+def watch(name, executor):
+    pools[name] = executor
+
+
+def request_started():
+    if ENABLED:
+        IN_FLIGHT.inc()
+
+
+def request_finished(route, method, status, seconds):
+    if not ENABLED:
+        return
+    IN_FLIGHT.dec()
+    REQUEST_SECONDS.labels(route, method).observe(seconds)
+    RESPONSES.labels(route, method, str(status)).inc()
+
+    # Sampled as requests finish, the queues read are private to ThreadPoolExecutor
+    for name, executor in pools.items():
+        POOL_QUEUED.labels(name).set(executor._work_queue.qsize())
+        POOL_WORKERS.labels(name).set(len(executor._threads))
+
+
+# Body and content type of the /metrics endpoint
+def render():
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
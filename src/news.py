@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+
+import cache
+import config
+import prefetch
+from errors import ScrapeError
+
+logger = logging.getLogger(__name__)
+
+# Server-Sent Events, one event per new article
+MIMETYPE = "text/event-stream"
+
+HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+# Open streams of a threaded worker
+streams = threading.BoundedSemaphore(config.NEWS_MAX_STREAMS)
+
+stopped = threading.Event()
+thread = None
+task = None
+
+
+# Articles are told apart by their link and publication date
+def identity(item):
+    return item["link"], item["pub_date"]
+
+
+# Publication date as a unix timestamp, now when the feed has none or a broken one
+def published(item):
+    try:
+        return int(parsedate_to_datetime(item["pub_date"]).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+# Latest articles in arrival order, each with a cursor. Cursors are publication
+# timestamps, bumped past the previous one when needed, so a later article always
+# gets a larger one. The bumps depend on what this worker saw and in which order, so
+# another worker can give the same article a different cursor.
+class Feed:
+    def __init__(self, size):
+        self.items = deque(maxlen=size)
+        # Articles already seen, kept longer than the buffer so evicted ones still
+        # in the RSS feed don't come back as new
+        self.seen = OrderedDict()
+        self.max_seen = size * 4
+        self.cursor = 0
+        self.cond = threading.Condition()
+        # (event loop, asyncio.Event) of async streams waiting for articles
+        self.waiters = set()
+
+    # Add the articles of a RSS feed, newest first, returns how many were new
+    def add(self, items):
+        added = 0
+        with self.cond:
+            for item in reversed(items):
+                key = identity(item)
+                if key in self.seen:
+                    continue
+                self.seen[key] = True
+                if len(self.seen) > self.max_seen:
+                    self.seen.popitem(last=False)
+                self.cursor = max(published(item), self.cursor + 1)
+                self.items.append((self.cursor, item))
+                added += 1
+            if added:
+                self.cond.notify_all()
+                for loop, event in self.waiters:
+                    loop.call_soon_threadsafe(event.set)
+        return added
+
+    # (cursor, article) pairs past cursor, newest first
+    def since(self, cursor):
+        with self.cond:
+            return [entry for entry in reversed(self.items) if entry[0] > cursor]
+
+    # Articles past cursor, waiting at most timeout seconds for some
+    def wait(self, cursor, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.cursor > cursor or stopped.is_set(), timeout)
+            return self.since(cursor)
+
+    async def wait_async(self, cursor, timeout):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.cond:
+            if self.cursor > cursor:
+                return self.since(cursor)
+            self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.cond:
+                self.waiters.discard(waiter)
+        return self.since(cursor)
+
+
+feed = Feed(config.NEWS_BUFFER)
+
+
+# since query argument or Last-Event-ID header, raises ScrapeError when it isn't valid
+def cursor(value, default=0):
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ScrapeError("Invalid cursor", 400)
+
+
+def event(entry):
+    return "id: %d\nevent: news\ndata: %s\n\n" % (entry[0], json.dumps(entry[1], separators=(",", ":")))
+
+
+KEEPALIVE = ": keepalive\n\n"
+
+
+# Event stream of the articles past cursor, a comment keeps idle connections open
+def events(cursor):
+    while not stopped.is_set():
+        entries = feed.wait(cursor, config.NEWS_KEEPALIVE)
+        if not entries:
+            yield KEEPALIVE
+            continue
+        for entry in reversed(entries):
+            yield event(entry)
+        cursor = entries[0][0]
+
+
+async def aevents(cursor):
+    while not stopped.is_set():
+        entries = await feed.wait_async(cursor, config.NEWS_KEEPALIVE)
+        if not entries:
+            yield KEEPALIVE
+            continue
+        for entry in reversed(entries):
+            yield event(entry)
+        cursor = entries[0][0]
+
+
+# Fetch the RSS feed into the buffer. As with prefetch, with the sqlite tier only one
+# worker calls hltv.org and the others read the feed it cached.
+def poll(scraper):
+    key = (scraper.namespace,)
+    if prefetch.leader():
+        items = cache.load(scraper.namespace, key, scraper.uncached, (), cache.lookup(key))
+    else:
+        items = scraper()
+    return feed.add(items)
+
+
+def run(scraper):
+    while not stopped.is_set():
+        try:
+            poll(scraper)
+        except Exception as e:
+            logger.warning("news poll failed: %s", e)
+        stopped.wait(config.NEWS_INTERVAL)
+
+
+# Poll the RSS feed every NEWS_INTERVAL seconds in a background thread, scraper is
+# the cache.cached news function
+def start(scraper):
+    global thread
+    if thread is not None or task is not None or not config.NEWS_POLL_ENABLED:
+        return
+    thread = threading.Thread(target=run, args=(scraper,), name="news", daemon=True)
+    thread.start()
+
+
+# Async twin of run, fetch returns the articles of one poll
+async def arun(fetch):
+    while not stopped.is_set():
+        try:
+            feed.add(await fetch())
+        except Exception as e:
+            logger.warning("news poll failed: %s", e)
+        await asyncio.sleep(config.NEWS_INTERVAL)
+
+
+def start_async(fetch):
+    global task
+    if thread is not None or task is not None or not config.NEWS_POLL_ENABLED:
+        return
+    task = asyncio.ensure_future(arun(fetch))
+
+
+def stop():
+    stopped.set()
+    with feed.cond:
+        feed.cond.notify_all()
+    if task is not None:
+        task.cancel()
@@ -0,0 +1,151 @@
+import xml.etree.ElementTree as ET
+
+import config
+import metrics
+import parsers
+import schemas
+from errors import ScrapeError
+
+# Page parsers, a downloaded body in and a payload out. They do no I/O, so the sync
+# routes, the async core and worker pools can all run them.
+
+
+def run(schema, body):
+    with metrics.stage("parse", schema.name):
+        soup = parsers.parse(body, *schema.parse_only)
+    with metrics.stage("extract", schema.name):
+        return schema.extract(soup)
+
+
+def upcoming(body):
+    return run(schemas.UPCOMING, body)
+
+
+def results(body):
+    return run(schemas.RESULTS, body)
+
+
+def ranking(body):
+    return run(schemas.RANKING, body)
+
+
+# keys limits the extraction to those top level fields, None extracts them all
+def team(body, team_id, keys=None):
+    schema = schemas.TEAM if keys is None else schemas.TEAM.select(keys)
+    with metrics.stage("parse", schemas.TEAM.name):
+        soup = parsers.parse(body, *schemas.TEAM.parse_only)
+    team_profile = soup.select_one(".teamProfile")
+
+    if not team_profile:
+        raise ScrapeError("There is no team available, something went wrong.", 404)
+
+    with metrics.stage("extract", schemas.TEAM.name):
+        return dict(id=int(team_id), **schema.extract(team_profile))
+
+
+def player(body, player_id, keys=None):
+    schema = schemas.PLAYER if keys is None else schemas.PLAYER.select(keys)
+    return dict(id=player_id, **run(schema, body))
+
+
+def player_summary(body):
+    return run(schemas.PLAYER_SUMMARY, body)
+
+
+# Identity part of the stats summary page, without its statistics
+def player_profile(body):
+    return run(schemas.PLAYER_SUMMARY.select(("profile",)), body)["profile"]
+
+
+def individual_stats(body):
+    return run(schemas.INDIVIDUAL_STATS, body)
+
+
+# Merge both stats pages, the individual page wins on shared labels
+def player_stats(summary, individual):
+    stats_data = dict(summary["stats"], **individual)
+    return schemas.player_statistics_payload(summary, stats_data)
+
+
+def news(xml):
+    if not xml.startswith("<?xml"):
+        raise ScrapeError("Invalid XML", 400)
+
+    with metrics.stage("parse", "news"):
+        root = ET.fromstring(xml)
+    rss = []
+
+    with metrics.stage("extract", "news"):
+        for item in root.findall("./channel/item"):
+            rss.append(
+                {
+                    "title": item.find("./title").text,
+                    "description": item.find("./description").text,
+                    "link": item.find("./link").text,
+                    "pub_date": item.find("./pubDate").text,
+                }
+            )
+
+    return rss
+
+
+# Search results, /search?term=<term> answers json
+def team_search(results):
+    return search_team(first(results, "team"))
+
+
+def player_search(results):
+    return search_player(first(results, "player"))
+
+
+# hltv.org's first answer of a kind, searches answering none of it are a 404
+def first(results, kind):
+    found = results[0].get(kind + "s") if results else None
+    if not found:
+        raise not_found(kind)
+    return found[0]
+
+
+def not_found(kind):
+    return ScrapeError("No %s found" % kind, 404)
+
+
+# One team or player of the search results
+def search_team(res):
+    players = []
+    for player in res["players"]:
+        players.append(
+            {
+                "nickname": player["nickName"],
+                "firstName": player["firstName"],
+                "lastName": player["lastName"],
+                "flag": player["flagUrl"],
+                "hltv_url": config.BASE_URL + player["location"],
+            }
+        )
+
+    return {
+        "id": res["id"],
+        "name": res["name"],
+        "logo": res["teamLogoDay"],
+        "flag": res["flagUrl"],
+        "hltv_url": config.BASE_URL + res["location"],
+        "players": players,
+    }
+
+
+def search_player(res):
+    return {
+        "id": res["id"],
+        "nickname": res["nickName"],
+        "firstName": res["firstName"],
+        "lastName": res["lastName"],
+        "flag": res["flagUrl"],
+        "picture": res["pictureUrl"],
+        "hltv_url": config.BASE_URL + res["location"],
+        "team": {
+            "name": res["team"]["name"],
+            "logo": res["team"]["teamLogoDay"],
+            "hltv_url": config.BASE_URL + res["team"]["location"],
+        },
+    }
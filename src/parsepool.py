@@ -0,0 +1,47 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+# Parsing and extraction hold the GIL, so threads only contend on them. With
+# PARSE_PROCESSES set, the page body goes to a worker process and only the
+# extracted payload comes back.
+
+executor = None
+lock = threading.Lock()
+
+
+def warmup():
+    # Import the parsing stack once per worker instead of on its first page
+    import pages  # noqa: F401
+
+
+# Started lazily so it's created after gunicorn forks its workers. Spawned, not
+# forked, since the calling process already runs threads.
+def pool():
+    global executor
+    if executor is None and config.PARSE_PROCESSES > 0:
+        with lock:
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=config.PARSE_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warmup,
+                )
+    return executor
+
+
+# Run a page parser, in a worker process when the pool is enabled
+def run(fn, *args):
+    executor = pool()
+    if executor is None:
+        return fn(*args)
+    return executor.submit(fn, *args).result()
+
+
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
@@ -0,0 +1,44 @@
+import functools
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import config
+
+
+# Resolve the configured tree builder once, lxml is a C parser and much faster
+def resolve_backend(name):
+    if name == "lxml":
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            return "html.parser"
+    return name
+
+
+BACKEND = resolve_backend(config.HTML_PARSER)
+
+
+# Match elements by any of their classes, bs4 versions differ on whether a
+# multi-valued class attribute reaches the strainer split or as one string
+@functools.lru_cache(maxsize=None)
+def strainer(classes):
+    wanted = frozenset(classes)
+
+    def match(value):
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return not wanted.isdisjoint(value)
+
+    return SoupStrainer(class_=match)
+
+
+# Parse an html page, when classes are given only the elements carrying one of
+# them are built (with their whole subtree), the rest of the page is skipped
+def parse(body, *classes, backend=None):
+    return BeautifulSoup(
+        body,
+        backend or BACKEND,
+        parse_only=strainer(classes) if classes else None,
+    )
@@ -0,0 +1,96 @@
+import fcntl
+import logging
+import threading
+import time
+
+import cache
+import config
+import metrics
+from errors import Unavailable
+
+logger = logging.getLogger(__name__)
+
+# Keeps the ranking, the ranked teams and their players warm in cache. Every
+# PREFETCH_INTERVAL seconds it walks them and reloads the entries that would expire
+# before the next walk, at most PREFETCH_RATE upstream pages per second.
+
+stopped = threading.Event()
+thread = None
+lock_file = None
+
+
+# With the sqlite tier, one worker prefetches for all of them: its entries reach the
+# others through the shared database. Memory-only workers each warm their own cache.
+def leader():
+    global lock_file
+    if config.CACHE_BACKEND != "sqlite":
+        return True
+    if lock_file is None:
+        f = open(config.CACHE_SQLITE_PATH + ".prefetch.lock", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        lock_file = f
+    return True
+
+
+# Reload a cached scraper's entry when it expires before the next walk, returns
+# whether hltv.org was called
+def warm(scraper, *args):
+    key = (scraper.namespace,) + args
+    entry = cache.lookup(key)
+    if entry is not None and entry.fresh_until > time.time() + config.PREFETCH_INTERVAL:
+        return False
+    cache.load(scraper.namespace, key, scraper.uncached, args, entry)
+    metrics.cache_event(scraper.namespace, "prefetched")
+    return True
+
+
+def pace(fetched):
+    if fetched:
+        stopped.wait(1 / config.PREFETCH_RATE)
+
+
+# One walk, the ranking first and then every ranked team and its players
+def walk(ranking, team_scrapers, player):
+    pace(warm(ranking))
+    for team in ranking():
+        jobs = [(scraper, str(team["id"])) for scraper in team_scrapers]
+        jobs += [(player, str(p["id"])) for p in team["players"]]
+        for scraper, item_id in jobs:
+            if stopped.is_set():
+                return
+            try:
+                pace(warm(scraper, item_id))
+            except Unavailable:
+                # Throttled or circuit open, leave the rest for the next walk
+                raise
+            except Exception:
+                logger.exception("prefetch of %s %s failed", scraper.namespace, item_id)
+
+
+def run(ranking, team_scrapers, player):
+    while not stopped.is_set():
+        if leader():
+            try:
+                walk(ranking, team_scrapers, player)
+            except Exception as e:
+                logger.warning("prefetch walk stopped early: %s", e)
+        stopped.wait(config.PREFETCH_INTERVAL)
+
+
+# Start prefetching in a background thread, scrapers are cache.cached functions
+def start(ranking, team_scrapers, player):
+    global thread
+    if thread is not None or not config.PREFETCH_ENABLED:
+        return
+    thread = threading.Thread(
+        target=run, args=(ranking, team_scrapers, player), name="prefetch", daemon=True
+    )
+    thread.start()
+
+
+def stop():
+    stopped.set()
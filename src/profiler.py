@@ -0,0 +1,111 @@
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import config
+
+# Opt-in wall clock profiles of single requests. A sampler thread records the stacks of
+# the request thread and of the pool threads working for it, then writes them in the
+# folded format read by flamegraph.pl, speedscope and inferno. Network waits show up
+# as time in socket reads, parsing as time in bs4/soupsieve.
+
+ENABLED = bool(config.PROFILE_DIR)
+
+# Profile of the request running in this context, followed into pool threads
+active = contextvars.ContextVar("profile", default=None)
+
+
+def frame_name(code):
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+# Stack of a frame, root first, in folded form
+def fold(frame, thread):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    names.append(thread)
+    return ";".join(reversed(names))
+
+
+class Profile(threading.Thread):
+    def __init__(self, label):
+        super().__init__(name="profiler", daemon=True)
+        self.label = label
+        self.started = time.perf_counter()
+        self.threads = {}
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def attach(self):
+        thread = threading.current_thread()
+        with self.lock:
+            self.threads[thread.ident] = thread.name
+
+    def detach(self):
+        with self.lock:
+            self.threads.pop(threading.get_ident(), None)
+
+    def run(self):
+        while not self.stopped.wait(config.PROFILE_INTERVAL):
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads.items())
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[fold(frame, name)] += 1
+
+    # Stop sampling and write the profile, returns its file name
+    def finish(self):
+        self.stopped.set()
+        self.join()
+        elapsed = int((time.perf_counter() - self.started) * 1000)
+        name = "%d-%s-%dms.folded" % (
+            time.time() * 1000,
+            re.sub(r"[^\w.-]+", "_", self.label).strip("_") or "root",
+            elapsed,
+        )
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(config.PROFILE_DIR, name), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("%s %d\n" % (stack, count))
+        return name
+
+
+# Profile the current request when asked by header or picked by the sample rate,
+# returns None otherwise
+def start(label, headers):
+    if not ENABLED:
+        return None
+    if headers.get(config.PROFILE_HEADER) != "1" and random.random() >= config.PROFILE_RATE:
+        return None
+    profile = Profile(label)
+    profile.attach()
+    profile.start()
+    active.set(profile)
+    return profile
+
+
+def stop(profile):
+    active.set(None)
+    return profile.finish()
+
+
+# Run fn(*args) in a pool thread, sampled along with the request that scheduled it
+def follow(fn, *args, **kwargs):
+    profile = active.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    profile.attach()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profile.detach()
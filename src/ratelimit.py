@@ -0,0 +1,137 @@
+import email.utils
+import logging
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+import config
+from errors import RateLimited
+
+logger = logging.getLogger(__name__)
+
+# Path prefixes of each budget, anything else is a team or player page
+CLASSES = [
+    ("/search", "search"),
+    ("/ranking", "ranking"),
+    ("/stats/", "stats"),
+    ("/rss", "rss"),
+]
+
+
+def classify(url):
+    path = urlsplit(url).path
+    for prefix, name in CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "team"
+
+
+# Token bucket handing out reservations, a caller is told how long to wait for its
+# token instead of polling for it. Its rate halves on each block and recovers
+# slowly as requests go through again.
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.scale = 1.0
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate * self.scale
+        )
+        self.updated = now
+
+    # Seconds until a token is available, it's only taken when that's before until
+    def reserve(self, now, not_before, until):
+        with self.lock:
+            self.refill(now)
+            wait = max(not_before - now, (1 - self.tokens) / (self.rate * self.scale), 0)
+            if now + wait <= until:
+                self.tokens -= 1
+            return wait
+
+    def penalize(self):
+        with self.lock:
+            self.scale = max(self.scale / 2, 1 / 16)
+            self.tokens = min(self.tokens, 0)
+
+    def recover(self):
+        with self.lock:
+            self.scale = min(self.scale + 1 / 16, 1.0)
+
+
+buckets = {name: TokenBucket(*budget) for name, budget in config.RATE_LIMITS.items()}
+
+# Cloudflare blocks the whole host, so a 429/403 pauses every class
+BLOCKED = (403, 429)
+blocked_until = 0
+strikes = 0
+lock = threading.Lock()
+
+
+# Seconds to wait before calling url, raises RateLimited when it's over budget past
+# the queueing deadline
+def reserve(url, timeout=None):
+    if not config.RATE_LIMIT_ENABLED:
+        return 0
+    now = time.monotonic()
+    until = now + (config.RATE_LIMIT_WAIT if timeout is None else timeout)
+    wait = buckets[classify(url)].reserve(now, blocked_until, until)
+    if now + wait > until:
+        raise RateLimited("Upstream rate limited, retry in %ds" % math.ceil(wait), 503)
+    return wait
+
+
+# Blocking reserve for the threaded scrapers
+def acquire(url, timeout=None):
+    wait = reserve(url, timeout)
+    if wait > 0:
+        time.sleep(wait)
+
+
+# Seconds asked by a Retry-After header, either a delay or an HTTP date
+def retry_after(headers):
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+# Adapt to an upstream response, backing off on 429/403 and recovering on success
+def observe(url, status, headers):
+    global blocked_until, strikes
+    if not config.RATE_LIMIT_ENABLED:
+        return
+    bucket = buckets[classify(url)]
+
+    if status in BLOCKED:
+        with lock:
+            strikes += 1
+            delay = retry_after(headers)
+            if delay is None:
+                delay = config.RATE_LIMIT_BACKOFF * 2 ** (strikes - 1)
+            delay = min(delay, config.RATE_LIMIT_MAX_BACKOFF)
+            blocked_until = max(blocked_until, time.monotonic() + delay)
+        bucket.penalize()
+        logger.warning("hltv.org answered %d on %s, backing off %.1fs", status, url, delay)
+    elif status < 400:
+        with lock:
+            strikes = 0
+        bucket.recover()
+
+
+# Error for a 429/403 answer, its body is Cloudflare's and not a page to parse
+def blocked(status):
+    wait = max(blocked_until - time.monotonic(), 0)
+    return RateLimited("hltv.org answered %d, retry in %ds" % (status, math.ceil(wait)), 503)
@@ -0,0 +1,717 @@
+import re
+
+import config
+from extract import Field, Schema, listing
+
+
+# Converters shared by the page schemas
+def path_id(href):
+    return int(href.split("/")[2])
+
+
+def absolute(path):
+    return config.BASE_URL + path
+
+
+# Some trophy pictures are served from a cdn, others from hltv itself
+def absolute_url(url):
+    return url if url.startswith("https://") else config.BASE_URL + url
+
+
+def percent(text):
+    return float(text.split("%")[0])
+
+
+def position(text):
+    return int(text.replace("#", ""))
+
+
+def first_number(text):
+    return int(re.findall(r"\d+", text)[0])
+
+
+def without_nickname(fullname, nickname):
+    return fullname.replace(f"'{nickname}'", "").replace("  ", " ")
+
+
+def first_string(node):
+    return node.contents[0]
+
+
+# Upcoming matches page, /matches?team=<id>
+UPCOMING_MATCH = Schema(
+    {
+        "id": Field("a", attr="href", convert=path_id),
+        # Opponent is always the other team
+        "opponent": Field(
+            ".matchTeam.team2",
+            schema=Schema(
+                {
+                    "name": Field(".matchTeamName"),
+                    "logo": Field(".matchTeamLogo", attr="src"),
+                }
+            ),
+        ),
+        "tournament": Field(
+            ".matchEvent",
+            schema=Schema(
+                {
+                    "name": Field(".matchEventName"),
+                    "logo": Field(".matchEventLogo", attr="src"),
+                }
+            ),
+        ),
+        "type": Field(".matchMeta"),
+        "date": Field(".matchTime", attr="data-unix", convert=int),
+        "match_url": Field("a", attr="href", convert=absolute),
+    }
+)
+
+UPCOMING = listing(
+    ".upcomingMatchesWrapper",
+    ".upcomingMatch",
+    UPCOMING_MATCH,
+    name="upcoming",
+    parse_only=("upcomingMatchesWrapper",),
+)
+
+
+# Results page, /results?team=<id>
+def result_payload(match):
+    # Check who won
+    victory = match["winner"] == match["team1"]
+    score = (
+        match["won"] + " - " + match["lost"]
+        if victory
+        else match["lost"] + " - " + match["won"]
+    )
+    return {
+        "id": path_id(match["href"]),
+        "result": "Victory" if victory else "Defeat",
+        "score": score,
+        "opponent": match["opponent"],
+        "tournament": match["tournament"],
+        "type": match["type"],
+        "match_url": absolute(match["href"]),
+    }
+
+
+RESULT = Schema(
+    {
+        "href": Field(attr="href"),
+        "team1": Field(".team1 .team"),
+        "opponent": Field(
+            ".team2",
+            schema=Schema(
+                {"name": Field(".team"), "logo": Field(".team-logo", attr="src")}
+            ),
+        ),
+        "winner": Field(".team-won"),
+        "won": Field(".result-score .score-won"),
+        "lost": Field(".result-score .score-lost"),
+        "tournament": Field(
+            schema=Schema(
+                {
+                    "name": Field(".event-name"),
+                    "logo": Field(".event-logo", attr="src"),
+                }
+            )
+        ),
+        "type": Field(".map-text"),
+    },
+    post=result_payload,
+)
+
+RESULTS = listing(
+    ".results-all",
+    ".results-sublist .result-con > a",
+    RESULT,
+    name="results",
+    parse_only=("results-all",),
+)
+
+
+# Ranking page, /ranking/teams
+def ranked_player_payload(player):
+    player["fullname"] = without_nickname(player["fullname"], player["nickname"])
+    return player
+
+
+RANKED_PLAYER = Schema(
+    {
+        "id": Field(attr="href", convert=path_id),
+        "nickname": Field(".nick"),
+        "fullname": Field(".playerPicture", attr="alt"),
+        "picture": Field(".playerPicture", attr="src"),
+        "hltv_url": Field(attr="href", convert=absolute),
+    },
+    root="a",
+    post=ranked_player_payload,
+)
+
+RANKED_TEAM = Schema(
+    {
+        "id": Field(".moreLink", attr="href", convert=path_id),
+        "ranking": Field(".position", convert=position),
+        "name": Field(".teamLine .name"),
+        "logo": Field(".team-logo img", attr="src"),
+        "players": Field(".player-holder", many=True, schema=RANKED_PLAYER),
+    }
+)
+
+RANKING = Schema(
+    {"teams": Field(".ranked-team", many=True, schema=RANKED_TEAM)},
+    post=lambda data: data["teams"],
+    name="ranking",
+    parse_only=("ranked-team",),
+)
+
+
+# Team page, /team/<id>/_
+def lineup_payload(player):
+    return {
+        "id": player["id"],
+        "fullname": without_nickname(player["fullname"], player["nickname"]),
+        "image": player["image"],
+        "nickname": player["nickname"],
+        "country": {"name": player["country"], "flag": player["flag"]}
+        if player["country"]
+        else None,
+    }
+
+
+def map_statistics_payload(maps):
+    map_stats = {
+        "dust2": None,
+        "mirage": None,
+        "inferno": None,
+        "overpass": None,
+        "nuke": None,
+        "vertigo": None,
+        "ancient": None,
+        "anubis": None,
+    }
+    for played in maps:
+        map_stats[played["name"].lower()] = played["win_percentage"]
+    return map_stats
+
+
+# Events that start and end at the same date only have one date
+def event_dates(dates):
+    return {"start": dates[0], "end": dates[1] if len(dates) > 1 else dates[0]}
+
+
+def stat_row(index, **kwargs):
+    return Field(
+        f".profile-team-stats-container > div:nth-of-type({index}) .right", **kwargs
+    )
+
+
+TEAM = Schema(
+    {
+        "name": Field(".profile-team-name"),
+        "logo": Field(".teamlogo", attr="src"),
+        "ranking": stat_row(1, convert=position),
+        "country": Field(
+            schema=Schema(
+                {
+                    "name": Field(".team-country"),
+                    "flag": Field(".flag", attr="src", convert=absolute),
+                }
+            )
+        ),
+        "average_player_age": stat_row(3, convert=float),
+        "coach": stat_row(4, strip=True),
+        "players": Field(
+            ".bodyshot-team > a",
+            many=True,
+            schema=Schema(
+                {
+                    "id": Field(attr="href", convert=path_id),
+                    "nickname": Field(attr="title"),
+                    "fullname": Field("img", attr="title"),
+                    "image": Field("img", attr="src"),
+                    "country": Field(".flag", attr="title"),
+                    "flag": Field(".flag", attr="src", convert=absolute),
+                },
+                post=lineup_payload,
+            ),
+        ),
+        "stats": Field(
+            schema=Schema(
+                {
+                    "last_5_maps": Field(
+                        schema=listing(
+                            ".last-5-matches",
+                            "a",
+                            Schema(
+                                {
+                                    "opponent": Field(".highlighted-team-name"),
+                                    "result": Field(".highlighted-match-status"),
+                                }
+                            ),
+                        ),
+                        required=False,
+                        default="[ERROR] No last 5 maps available...",
+                    ),
+                    "past_3_months": Field(
+                        schema=Schema(
+                            {
+                                "maps": Field(
+                                    ".map-statistics-container",
+                                    many=True,
+                                    schema=Schema(
+                                        {
+                                            "name": Field(
+                                                ".map-statistics-row-map-mapname"
+                                            ),
+                                            "win_percentage": Field(
+                                                ".map-statistics-row-win-percentage",
+                                                convert=percent,
+                                            ),
+                                        }
+                                    ),
+                                )
+                            },
+                            root=".map-statistics",
+                            post=lambda data: map_statistics_payload(data["maps"]),
+                        ),
+                        required=False,
+                        default="[ERROR] No map statistics available...",
+                    ),
+                }
+            )
+        ),
+        "trophies": Field(
+            schema=listing(
+                ".trophyRow",
+                "a",
+                Schema(
+                    {
+                        "name": Field(".trophyDescription", attr="title"),
+                        "logo": Field(".trophyIcon", attr="src"),
+                        "hltv_url": Field(attr="href", convert=absolute),
+                    }
+                ),
+            ),
+            required=False,
+            default=[],
+        ),
+        "social_media": Field(
+            ".socialMediaButtons > a",
+            many=True,
+            schema=Schema(
+                {
+                    "name": Field(attr="href", convert=lambda href: href.split(".")[1]),
+                    "link": Field(attr="href"),
+                }
+            ),
+        ),
+        "upcomming_events": Field(
+            schema=listing(
+                "#ongoingEvents .upcoming-events-holder",
+                "a",
+                Schema(
+                    {
+                        "name": Field(".eventbox-eventname"),
+                        "logo": Field(".eventbox-eventlogo img", attr="src"),
+                        "date": Field(
+                            schema=Schema(
+                                {
+                                    "dates": Field(
+                                        "span[data-unix]",
+                                        many=True,
+                                        attr="data-unix",
+                                        convert=int,
+                                    )
+                                },
+                                post=lambda data: event_dates(data["dates"]),
+                            )
+                        ),
+                        "hltv_url": Field(attr="href", convert=absolute),
+                    }
+                ),
+            ),
+            required=False,
+            default=[],
+        ),
+    },
+    name="team",
+    parse_only=("teamProfile",),
+)
+
+
+# Player page, /player/<id>/_
+def player_name(fullname):
+    return {
+        # Attribut fullname has a space between firstname, we want to remove it
+        "fullname": fullname,
+        "firstname": fullname.split(" ")[0],
+        "lastname": fullname.split(" ")[1],
+    }
+
+
+def top20_payload(appearances):
+    top20 = appearances[-1]
+    return {
+        "has_appeared": True,
+        "last_appearance": top20,
+        "all_appearances": appearances,
+    }
+
+
+def major_winner(text):
+    return {"winner": True, "champions": int(re.findall(r"\d{1}", text)[0])}
+
+
+def player_stats_payload(stats):
+    return {
+        "rating": float(stats[0]),
+        "kills_per_round": float(stats[1]),
+        "headshot_percentage": percent(stats[2]),
+        "maps_played": int(stats[3]),
+        "deaths_per_round": float(stats[4]),
+        "rounds_contributed": percent(stats[5]),
+    }
+
+
+TROPHY = Schema(
+    {
+        "name": Field(".trophy-event"),
+        "trophy": Field("img", attr="src", convert=absolute_url),
+        "event_url": Field("a", attr="href", convert=absolute),
+    }
+)
+
+TEAM_TROPHY = Schema(
+    {
+        "name": Field("img", attr="title"),
+        "trophy": Field("img", attr="src", convert=absolute),
+        "event_url": Field(attr="href", convert=absolute),
+    }
+)
+
+CURRENT_TEAM = Schema(
+    {
+        "name": Field(".team-name"),
+        "logo": Field(".team-logo", attr="src"),
+        "date": Field(
+            ".time-period-cell span",
+            attr="data-unix",
+            convert=lambda unix: {"entrance": int(unix), "left": None},
+        ),
+        "trophies": Field(schema=listing(".trophy-row-trophy", "a", TEAM_TROPHY)),
+        "hltv_url": Field(".team-name-cell a", attr="href", convert=absolute),
+    },
+    root=".team",
+)
+
+FORMER_TEAM = Schema(
+    {
+        "name": Field(".team-name"),
+        "logo": Field(".team-logo", attr="src"),
+        "date": Field(
+            schema=Schema(
+                {
+                    "dates": Field(
+                        ".time-period-cell span",
+                        many=True,
+                        attr="data-unix",
+                        convert=int,
+                    )
+                },
+                post=lambda data: {
+                    "entrance": data["dates"][0],
+                    "left": data["dates"][1],
+                },
+            )
+        ),
+        "trophies": Field(schema=listing(".trophy-row-trophy", "a", TEAM_TROPHY)),
+        "hltv_url": Field(".team-name-cell a", attr="href", convert=absolute),
+    }
+)
+
+PLAYER = Schema(
+    {
+        "nickname": Field(".playerNickname"),
+        "name": Field(".playerRealname", strip=True, convert=player_name),
+        "picture": Field(".bodyshot-img", attr="src"),
+        "age": Field(".playerAge", convert=first_number),
+        "flag": Field(".flag", attr="src", convert=absolute),
+        "teams": Field(
+            schema=Schema(
+                {
+                    # General data about player and team
+                    "general_data": Field(
+                        schema=Schema(
+                            {"stats": Field(".stat", many=True, convert=int)},
+                            post=lambda data: {
+                                "numbers_teams": data["stats"][0],
+                                "day_in_current_team": data["stats"][1],
+                                "day_in_team": data["stats"][2],
+                            },
+                        ),
+                        required=False,
+                        default="error when getting general data",
+                    ),
+                    "current_team": Field(schema=CURRENT_TEAM, required=False),
+                    "former_teams": Field(
+                        ".past-team",
+                        many=True,
+                        schema=FORMER_TEAM,
+                        required=False,
+                        default="error when fetching former teams",
+                    ),
+                }
+            )
+        ),
+        "trophies": Field(
+            schema=Schema(
+                {
+                    "trophies": Field(
+                        schema=listing("#Trophies", ".trophy-detail", TROPHY),
+                        required=False,
+                        default="error when fetching trophies",
+                    ),
+                    "mvps": Field(
+                        schema=listing("#MVPs", ".trophy-detail", TROPHY),
+                        required=False,
+                        default="error when fetching mvps",
+                    ),
+                    # All appearances in hltv top 20
+                    "htlv_top20": Field(
+                        schema=Schema(
+                            {
+                                "appearances": Field(
+                                    schema=listing(
+                                        ".top20ListRight",
+                                        "a",
+                                        Schema(
+                                            {
+                                                "year": Field(
+                                                    attr="href",
+                                                    convert=lambda href: int(
+                                                        re.findall(r"\d{4}", href)[1]
+                                                    ),
+                                                ),
+                                                "positon": Field(
+                                                    convert=lambda text: int(
+                                                        text.split("#")[0]
+                                                    )
+                                                ),
+                                                "news": Field(attr="href", convert=absolute),
+                                            }
+                                        ),
+                                    )
+                                )
+                            },
+                            post=lambda data: top20_payload(data["appearances"]),
+                        ),
+                        required=False,
+                        default={
+                            "has_appeared": False,
+                            "last_appearance": None,
+                            "all_appearances": [],
+                        },
+                    ),
+                }
+            )
+        ),
+        "stats": Field(
+            schema=Schema(
+                {"values": Field(".statsVal", many=True)},
+                post=lambda data: player_stats_payload(data["values"]),
+            )
+        ),
+        "major_winner": Field(
+            ".majorWinner",
+            convert=major_winner,
+            required=False,
+            default={"winner": False, "champions": None},
+        ),
+    },
+    root=".playerProfile",
+    name="player",
+    parse_only=("playerProfile",),
+)
+
+
+# Player statistics pages, /stats/players/<id>/_ and /stats/players/individual/<id>/_
+def stats_row(spans):
+    return spans[0].strip(), percent(spans[1])
+
+
+# Only KAST and Impact are read from the summary breakdown
+def breakdown(rows):
+    stats = {}
+    for header, value in rows:
+        if header == "KAST":
+            stats[header] = percent(value)
+        elif header == "Impact":
+            stats[header] = float(value)
+    return stats
+
+
+def player_summary_payload(data):
+    stats = dict(data["stats"])
+    stats.update(breakdown(data["breakdown"]))
+    return dict(data["profile"], stats=stats, shape=data["shape"])
+
+
+PLAYER_SUMMARY = Schema(
+    {
+        "profile": Field(
+            schema=Schema(
+                {
+                    "name": Field(".summaryNickname"),
+                    "fullname": Field(".summaryRealname", strip=True),
+                    "age": Field(".summaryPlayerAge", convert=first_number),
+                    "flag": Field(".flag", attr="src", convert=absolute),
+                    "team": Field(".SummaryTeamname a", attr="href", convert=absolute),
+                },
+                root=".playerSummaryStatBox",
+            )
+        ),
+        "stats": Field(
+            ".statistics .stats-row",
+            many=True,
+            schema=Schema(
+                {"spans": Field("span", many=True)},
+                post=lambda data: stats_row(data["spans"]),
+            ),
+        ),
+        "breakdown": Field(
+            ".summaryStatBreakdownRow .summaryStatBreakdown",
+            many=True,
+            schema=Schema(
+                {
+                    "header": Field(
+                        ".summaryStatBreakdownSubHeader", attr=first_string, strip=True
+                    ),
+                    "value": Field(".summaryStatBreakdownDataValue"),
+                },
+                post=lambda data: (data["header"], data["value"]),
+            ),
+        ),
+        # Player's shape
+        "shape": Field(
+            ".featured-ratings-container .rating-value", many=True, convert=float
+        ),
+    },
+    post=player_summary_payload,
+    name="player_stats",
+    parse_only=(
+        "playerSummaryStatBox",
+        "statistics",
+        "summaryStatBreakdownRow",
+        "featured-ratings-container",
+    ),
+)
+
+# Just to avoid errors on specific data, rows that can't be read are skipped
+INDIVIDUAL_STATS = Schema(
+    {
+        "stats": Field(
+            ".columns .standard-box .stats-row",
+            many=True,
+            skip=True,
+            schema=Schema(
+                {"spans": Field("span", many=True)},
+                post=lambda data: stats_row(data["spans"]),
+            ),
+        )
+    },
+    post=lambda data: dict(data["stats"]),
+    name="player_individual_stats",
+    parse_only=("columns",),
+)
+
+
+# Top level keys of player_statistics_payload, all but stats come from the summary profile
+PLAYER_STATISTICS_FIELDS = ("name", "fullname", "age", "flag", "team", "stats")
+
+
+def player_statistics_payload(summary, stats_data):
+    shape = summary["shape"]
+    return {
+        "name": summary["name"],
+        "fullname": summary["fullname"],
+        "age": summary["age"],
+        "flag": summary["flag"],
+        "team": summary["team"],
+        "stats": {
+            "rating": stats_data["Rating 1.0"],
+            "kast": stats_data["KAST"],
+            "impact": stats_data["Impact"],
+            "total_kills": stats_data["Total kills"],
+            "headshot_percentage": stats_data["Headshot %"],
+            "total_deaths": stats_data["Total deaths"],
+            "k/d_ratio": stats_data["K/D Ratio"],
+            "damage_per_round": stats_data["Damage / Round"],
+            "grenae_damage_per_round": stats_data["Grenade dmg / Round"],
+            "maps_played": stats_data["Maps played"],
+            "rounds_played": stats_data["Rounds played"],
+            "kills_per_round": stats_data["Kills / round"],
+            "assists_per_round": stats_data["Assists / round"],
+            "deaths_per_round": stats_data["Deaths / round"],
+            "saved_by_teammates": stats_data["Saved by teammate / round"],
+            "saved_teammates": stats_data["Saved teammates / round"],
+            "featured_rating": {
+                "vs_top_5": shape[0],
+                "vs_top_10": shape[1],
+                "vs_top_20": shape[2],
+                "vs_top_30": shape[3],
+                "vs_top_50": shape[4],
+            },
+            "rounds_stats": {
+                "0_kill_per_rounds": stats_data["0 kill rounds"],
+                "1_kill_per_rounds": stats_data["1 kill rounds"],
+                "2_kill_per_rounds": stats_data["2 kill rounds"],
+                "3_kill_per_rounds": stats_data["3 kill rounds"],
+                "4_kill_per_rounds": stats_data["4 kill rounds"],
+                "5_kill_per_rounds": stats_data["5 kill rounds"],
+            },
+            "opening_stats": {
+                "total_opening_kills": stats_data["Total opening kills"],
+                "total_opening_deaths": stats_data["Total opening deaths"],
+                "opening_kill_ratio": stats_data["Opening kill ratio"],
+                "opening_kill_rating": stats_data["Opening kill rating"],
+                "win_percentage_after_opening_kill": stats_data[
+                    "Team win percent after first kill"
+                ],
+                "first_kill_won_per_round": stats_data[
+                    "First kill in won rounds"
+                ],
+            },
+            "weapon_stats": {
+                "rifles": stats_data["Rifle kills"],
+                "snipers": stats_data["Sniper kills"],
+                "smgs": stats_data["SMG kills"],
+                "pistols": stats_data["Pistol kills"],
+                "nades": stats_data["Grenade"],
+                "other": stats_data["Other"],
+            },
+            "clutch_stats": {
+                "1v1": {
+                    "wins": "",
+                    "losses": "",
+                },
+                "1v2": {
+                    "wins": "",
+                    "losses": "",
+                },
+                "1v3": {
+                    "wins": "",
+                    "losses": "",
+                },
+                "1v4": {
+                    "wins": "",
+                    "losses": "",
+                },
+                "1v5": {
+                    "wins": "",
+                    "losses": "",
+                },
+            },
+        },
+    }
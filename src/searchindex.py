@@ -0,0 +1,187 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+import config
+import pages
+from cache import LRUCache
+from errors import ScrapeError
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("team", "player")
+UNRANKED = float("inf")
+
+
+# Case and spacing insensitive form of a name or search term
+def normalize(text):
+    return " ".join(str(text).casefold().split())
+
+
+# Ids are numbers in search answers, strings in some scraped payloads
+def ident(value):
+    return int(value)
+
+
+# Names of teams and players in a sorted array, a prefix matches one contiguous run
+# of it. Search answers are kept whole to serve /search without hltv.org.
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (normalized name, kind, id), sorted
+        self.keys = []
+        # (kind, id) -> (normalized name, name)
+        self.names = {}
+        # (kind, id) -> ranking position, players get the one of their team
+        self.ranks = {}
+        self.ranked = set()
+        # (kind, id) -> (search payload, learnt at)
+        self.payloads = {}
+        # (kind, normalized term) -> (id of hltv.org's first answer, learnt at)
+        self.terms = LRUCache(config.SEARCH_MAX_TERMS)
+        # Answered prefixes, cleared whenever a name or a rank changes
+        self.completions = LRUCache(config.SEARCH_MAX_TERMS)
+
+    def add(self, kind, item_id, name, rank=None):
+        if not name:
+            return
+        key = (kind, ident(item_id))
+        entry = (normalize(name), name)
+        with self.lock:
+            changed = False
+            old = self.names.get(key)
+            if old != entry:
+                if old is not None:
+                    del self.keys[bisect.bisect_left(self.keys, (old[0], *key))]
+                bisect.insort(self.keys, (entry[0], *key))
+                self.names[key] = entry
+                changed = True
+            if rank is not None and self.ranks.get(key) != rank:
+                self.ranks[key] = rank
+                changed = True
+            if changed:
+                self.completions.clear()
+
+    # Top 30 teams and their players, ranked by the team position. Teams that left
+    # the ranking lose their rank.
+    def ranking(self, teams):
+        ranked = set()
+        for position, team in enumerate(teams, start=1):
+            self.add("team", team["id"], team["name"], position)
+            ranked.add(("team", ident(team["id"])))
+            for player in team["players"]:
+                self.add("player", player["id"], player["nickname"], position)
+                ranked.add(("player", ident(player["id"])))
+        with self.lock:
+            for key in self.ranked - ranked:
+                self.ranks.pop(key, None)
+            self.ranked = ranked
+            self.completions.clear()
+
+    # Team page payload, possibly a field selection of it
+    def team(self, payload):
+        self.add("team", payload["id"], payload.get("name"), payload.get("ranking"))
+        for player in payload.get("players") or ():
+            if "id" in player:
+                self.add("player", player["id"], player.get("nickname"), payload.get("ranking"))
+
+    def player(self, payload):
+        self.add("player", payload["id"], payload.get("nickname"))
+
+    # Keep every team and player of a search answer, and which came first for term
+    def learn(self, term, results):
+        now = time.time()
+        for kind, convert in (("team", pages.search_team), ("player", pages.search_player)):
+            first = None
+            for res in results[0].get(kind + "s", ()) if results else ():
+                try:
+                    payload = convert(res)
+                except (KeyError, TypeError):
+                    logger.warning("Skipped a %s of the search answer for %r", kind, term)
+                    continue
+                self.add(kind, payload["id"], payload["name" if kind == "team" else "nickname"])
+                with self.lock:
+                    self.payloads[(kind, ident(payload["id"]))] = (payload, now)
+                if first is None:
+                    first = ident(payload["id"])
+            self.terms.set((kind, normalize(term)), (first, now))
+
+    def searched(self, term):
+        entry = self.terms.get((KINDS[0], normalize(term)))
+        return entry is not None and time.time() - entry[1] < config.SEARCH_TTL
+
+    # The /search payload of term, None when it has to be asked to hltv.org. Terms
+    # asked before get the same first answer, or the same 404 when there was none,
+    # otherwise only an exact name matches.
+    def find(self, kind, term):
+        term = normalize(term)
+        entry = self.terms.get((kind, term))
+        now = time.time()
+        with self.lock:
+            if entry is not None and now - entry[1] < config.SEARCH_TTL:
+                if entry[0] is None:
+                    # hltv.org found none, answer it again without asking
+                    raise pages.not_found(kind)
+                candidates = [entry[0]]
+            else:
+                start = bisect.bisect_left(self.keys, (term,))
+                candidates = []
+                for name, item_kind, item_id in self.keys[start:]:
+                    if name != term:
+                        break
+                    if item_kind == kind:
+                        candidates.append(item_id)
+                candidates.sort(key=lambda item_id: self.ranks.get((kind, item_id), UNRANKED))
+            for item_id in candidates:
+                payload = self.payloads.get((kind, item_id))
+                if payload is not None and now - payload[1] < config.SEARCH_TTL:
+                    return payload[0]
+        return None
+
+    # Names starting with prefix, best ranked first, then shortest
+    def complete(self, prefix, kind=None, limit=config.SEARCH_COMPLETIONS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        memo = (prefix, kind, limit)
+        answer = self.completions.get(memo)
+        if answer is not None:
+            return answer
+
+        with self.lock:
+            start = bisect.bisect_left(self.keys, (prefix,))
+            end = bisect.bisect_left(self.keys, (prefix + "\uffff",), start)
+            best = heapq.nsmallest(
+                limit,
+                (key for key in self.keys[start:end] if kind is None or key[1] == kind),
+                key=lambda key: (self.ranks.get(key[1:], UNRANKED), len(key[0]), key),
+            )
+            answer = [
+                {
+                    "type": item_kind,
+                    "id": item_id,
+                    "name": self.names[(item_kind, item_id)][1],
+                    "rank": self.ranks.get((item_kind, item_id)),
+                }
+                for name, item_kind, item_id in best
+            ]
+            self.completions.set(memo, answer)
+        return answer
+
+
+index = SearchIndex()
+
+
+# autocomplete query arguments, raises ScrapeError when they aren't valid
+def options(kind, limit):
+    if kind is not None and kind not in KINDS:
+        raise ScrapeError("type must be team or player", 400)
+    try:
+        limit = int(limit or config.SEARCH_COMPLETIONS)
+    except ValueError:
+        raise ScrapeError("limit must be an integer", 400)
+    if not 0 < limit <= config.SEARCH_MAX_COMPLETIONS:
+        raise ScrapeError("limit must be between 1 and %d" % config.SEARCH_MAX_COMPLETIONS, 400)
+    return kind, limit
@@ -0,0 +1,60 @@
+import functools
+import threading
+
+
+# One in-flight call, followers wait on it and share its outcome
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Coalesce concurrent calls with the same key into a single execution
+class Group:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn(*args, **kwargs)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+group = Group()
+
+
+# Share one fetch-and-parse between concurrent callers of the same upstream url,
+# the url template is formatted with the call arguments to build the key. Arguments
+# past the url ones (field selections) are part of the key too.
+def coalesce(url):
+    placeholders = url.count("{}")
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            return group.do((url.format(*args),) + args[placeholders:], fn, *args)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,108 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    validators TEXT
+);
+DROP TABLE IF EXISTS pages;
+"""
+
+
+# sqlite database shared by the threads of a worker, its connections can't be shared
+# between threads so each one gets its own
+class SQLiteDatabase:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+
+# Persistent store for parsed payloads, survives restarts. Payloads older than
+# retention are dropped at start and then at most every PRUNE_INTERVAL seconds.
+# Disk errors are logged and treated as misses so they never fail a request.
+class SQLiteStore(SQLiteDatabase):
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, path, retention):
+        super().__init__(path)
+        self.retention = retention
+        self.next_prune = 0
+        try:
+            conn = self.connection()
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(payloads)")]
+            if "validators" not in columns:
+                # Databases written before payloads kept their page validators
+                conn.execute("ALTER TABLE payloads ADD COLUMN validators TEXT")
+            conn.commit()
+        except sqlite3.Error:
+            logger.exception("Could not initialise sqlite cache at %s", path)
+        self.prune()
+
+    def prune(self):
+        now = time.time()
+        self.next_prune = now + min(self.retention, self.PRUNE_INTERVAL)
+        try:
+            conn = self.connection()
+            conn.execute("DELETE FROM payloads WHERE fetched_at < ?", (now - self.retention,))
+            conn.commit()
+        except sqlite3.Error:
+            logger.exception("sqlite cache prune failed")
+
+    def get_payload(self, key):
+        try:
+            row = (
+                self.connection()
+                .execute(
+                    "SELECT value, fetched_at, fresh_until, stale_until, validators"
+                    " FROM payloads WHERE key = ?",
+                    (json.dumps(key),),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error:
+            logger.exception("sqlite cache read failed")
+            return None
+        if row is None:
+            return None
+        validators = json.loads(row[4]) if row[4] is not None else None
+        return (json.loads(row[0]),) + tuple(row[1:4]) + (validators,)
+
+    def set_payload(self, key, value, fetched_at, fresh_until, stale_until, validators=None):
+        if time.time() >= self.next_prune:
+            self.prune()
+        try:
+            conn = self.connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    json.dumps(key),
+                    json.dumps(value),
+                    fetched_at,
+                    fresh_until,
+                    stale_until,
+                    json.dumps(validators) if validators is not None else None,
+                ),
+            )
+            conn.commit()
+        except (sqlite3.Error, TypeError, ValueError):
+            logger.exception("sqlite cache write failed")
@@ -0,0 +1,60 @@
+import argparse
+import random
+import time
+
+from flask import Flask, Response, request
+
+import archive
+
+# Local stand-in for hltv.org serving recorded responses, point the api at it with
+# HLTV_BASE_URL=http://localhost:<port> to load-test the whole app offline
+standin = Flask(__name__)
+standin.config.update(
+    ARCHIVE="archive", LATENCY=0.0, JITTER=0.0, ERROR_RATE=0.0, ERROR_STATUS=503
+)
+
+
+@standin.route("/", defaults={"path": ""})
+@standin.route("/<path:path>")
+def serve(path):
+    settings = standin.config
+
+    # Simulated upstream latency, uniform jitter around the configured mean
+    delay = settings["LATENCY"] + random.uniform(-1, 1) * settings["JITTER"]
+    if delay > 0:
+        time.sleep(delay)
+
+    if random.random() < settings["ERROR_RATE"]:
+        return Response("Injected error", status=settings["ERROR_STATUS"])
+
+    entry = archive.load(settings["ARCHIVE"], request.full_path.rstrip("?"))
+    if entry is None:
+        return Response("Not in archive", status=404)
+    response = Response(entry["body"], status=entry["status"], headers=entry["headers"])
+
+    # Answer conditional requests like hltv.org, with the recorded validators or a body hash
+    if response.status_code == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a recorded HLTV archive")
+    parser.add_argument("--archive", default="archive")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="delay jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="0.05 = 5%% errors")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    standin.config.update(
+        ARCHIVE=args.archive,
+        LATENCY=args.latency,
+        JITTER=args.jitter,
+        ERROR_RATE=args.error_rate,
+        ERROR_STATUS=args.error_status,
+    )
+    standin.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,34 @@
+import json
+
+# Opt-in NDJSON streaming for list payloads, one JSON document per line written as
+# soon as its entity is ready instead of one body built once they all are
+MIMETYPE = "application/x-ndjson"
+
+HEADERS = {
+    # Keep reverse proxies from buffering the stream back into one response
+    "X-Accel-Buffering": "no",
+}
+
+
+# Whether the client asked for NDJSON over plain JSON in its Accept header
+def requested(accept_mimetypes):
+    return accept_mimetypes.best_match(["application/json", MIMETYPE]) == MIMETYPE
+
+
+def line(item):
+    return json.dumps(item, separators=(",", ":")) + "\n"
+
+
+def lines(items):
+    for item in items:
+        yield line(item)
+
+
+# Async twin of lines, items can be an async iterable or a plain list
+async def alines(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield line(item)
+    else:
+        for item in items:
+            yield line(item)
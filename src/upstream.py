@@ -0,0 +1,137 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import archive
+import cache
+import circuit
+import config
+import metrics
+from errors import NotModified, UpstreamError
+import ratelimit
+
+# Advertise brotli only when a decoder is installed, urllib3 can't decode it otherwise
+try:
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+# Build the process-wide session, every call to hltv.org reuses its connections
+def create_session():
+    session = requests.Session()
+    session.headers.update(
+        {
+            "User-Agent": config.USER_AGENT,
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Connection": "keep-alive",
+        }
+    )
+
+    # Only retry idempotent connection failures, never on HTTP status
+    retries = Retry(
+        total=config.UPSTREAM_RETRIES,
+        connect=config.UPSTREAM_RETRIES,
+        read=0,
+        status=0,
+        backoff_factor=0.2,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.UPSTREAM_POOL_SIZE,
+        pool_maxsize=config.UPSTREAM_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = create_session()
+
+
+# Absolute url of an upstream path, relative paths are resolved against config.BASE_URL
+def absolute(url):
+    return config.BASE_URL + url if url.startswith("/") else url
+
+
+# Record the validators of a downloaded page in the cache entry loading it
+def remember(url, headers):
+    pages = cache.collected.get()
+    etag, modified = headers.get("ETag"), headers.get("Last-Modified")
+    if pages is not None and (etag or modified):
+        pages[url] = (etag, modified)
+
+
+# Headers making a request for url conditional on the page the entry being reloaded
+# was built from
+def conditions(url):
+    known = (cache.revalidating.get() or {}).get(url)
+    if known is None:
+        return {}
+
+    etag, modified = known
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    return headers
+
+
+# Remember the validators of a downloaded page and archive it when recording
+def keep(url, status, headers, body):
+    if status == 304:
+        # Nothing new, the archived page and its validators still stand
+        return
+    if 200 <= status < 300:
+        remember(url, headers)
+    if config.UPSTREAM_MODE == "record":
+        archive.save(config.UPSTREAM_ARCHIVE, url, status, headers, body)
+
+
+# Background recovery check of an open circuit, returns the upstream status
+def probe(url):
+    ratelimit.acquire(url)
+    return session.get(
+        url, timeout=(config.UPSTREAM_CONNECT_TIMEOUT, config.UPSTREAM_READ_TIMEOUT)
+    ).status_code
+
+
+# Fetch an upstream url through the shared session. A conditional request made while
+# its cache entry reloads raises NotModified when the page hasn't changed. A 429/403
+# raises RateLimited and a 5xx UpstreamError, the cached scrapers answer them with
+# their last payload instead of parsing an error page.
+def get(url, conditional=False, **kwargs):
+    url = absolute(url)
+    kwargs.setdefault(
+        "timeout", (config.UPSTREAM_CONNECT_TIMEOUT, config.UPSTREAM_READ_TIMEOUT)
+    )
+    if config.UPSTREAM_MODE == "replay":
+        return archive.replay(config.UPSTREAM_ARCHIVE, url)
+    if conditional and cache.revalidating.get():
+        kwargs["headers"] = dict(kwargs.get("headers") or {}, **conditions(url))
+
+    circuit.check(url)
+    ratelimit.acquire(url)
+    page = circuit.path(url)
+    try:
+        with metrics.upstream(page):
+            response = session.get(url, **kwargs)
+    except requests.RequestException:
+        metrics.upstream_response(page, "error")
+        circuit.record(url, None, probe)
+        raise
+    metrics.upstream_response(page, response.status_code)
+    circuit.record(url, response.status_code, probe)
+    ratelimit.observe(url, response.status_code, response.headers)
+    keep(url, response.status_code, response.headers, response.content)
+    if response.status_code == 304:
+        raise NotModified(url)
+    if response.status_code in ratelimit.BLOCKED:
+        raise ratelimit.blocked(response.status_code)
+    if response.status_code >= 500:
+        raise UpstreamError("hltv.org answered %d for %s" % (response.status_code, url), response.status_code)
+    return response
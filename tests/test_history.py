@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+# Keep the background pollers and the rate limiter out of the way
+os.environ["NEWS_POLL_ENABLED"] = "0"
+os.environ["PREFETCH_ENABLED"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["HISTORY_PATH"] = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+
+import config  # noqa: E402
+import history  # noqa: E402
+import singleflight  # noqa: E402
+
+# A team with five pages of results, newest first
+MATCHES = [{"id": 1000 - i} for i in range(5 * config.HISTORY_PAGE_SIZE)]
+
+
+# Serves results pages out of MATCHES and records the offsets asked
+class FakeResults:
+    def __init__(self):
+        self.offsets = []
+
+    def __call__(self, team_id, offset):
+        self.offsets.append(offset)
+        return MATCHES[offset:offset + config.HISTORY_PAGE_SIZE]
+
+
+def setup_function():
+    history.store = history.HistoryStore(os.path.join(tempfile.mkdtemp(), "history.sqlite3"))
+
+
+# A request joining the crawl of a shallower one must crawl again for its own depth
+def test_joining_a_shallower_crawl_still_answers_in_full(monkeypatch):
+    monkeypatch.setattr(history, "fetch", FakeResults())
+    do = singleflight.group.do
+    joined = []
+
+    def shallower(key, fn, team_id, depth):
+        if not joined:
+            joined.append(depth)
+            depth = 10
+        return do(key, fn, team_id, depth)
+
+    monkeypatch.setattr(singleflight.group, "do", shallower)
+
+    assert history.results("4494", 0, 250) == MATCHES[:250]
+
+
+# Queries within HISTORY_TTL backfill deeper but keep the time of the last head crawl
+def test_deeper_query_keeps_crawl_time(monkeypatch):
+    fake = FakeResults()
+    monkeypatch.setattr(history, "fetch", fake)
+
+    assert history.results("4494", 0, 50) == MATCHES[:50]
+    crawled_at = history.store.state("4494")[1]
+    assert history.results("4494", 100, 150) == MATCHES[100:250]
+    assert history.store.state("4494")[1] == crawled_at
+
+    # Only the first query read the newest page
+    assert fake.offsets.count(0) == 1
+
+
+def test_store_is_opened_on_first_use():
+    path = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    store = history.HistoryStore(path)
+    assert not os.path.exists(path)
+    assert store.count("4494") == 0
+    assert os.path.exists(path)
+
+
+def test_disk_errors_are_an_empty_history():
+    store = history.HistoryStore(os.path.join(tempfile.mkdtemp(), "missing", "history.sqlite3"))
+    assert store.state("4494") is None
+    assert store.count("4494") == 0
+    store.add("4494", MATCHES[:10], newer=True)
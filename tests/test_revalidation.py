@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+# Keep the background pollers and the rate limiter out of the way
+os.environ["NEWS_POLL_ENABLED"] = "0"
+os.environ["PREFETCH_ENABLED"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["HISTORY_PATH"] = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+
+import app  # noqa: E402
+import cache  # noqa: E402
+import history  # noqa: E402
+import upstream  # noqa: E402
+
+with open(os.path.join(HERE, "..", "bench", "fixtures", "results.html"), "rb") as f:
+    RESULTS = f.read()
+
+URL = upstream.absolute("/results?team=4494")
+
+
+# Serves pages with an ETag of their body and answers a matching If-None-Match with 304
+class FakeUpstream:
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        body = self.pages[url]
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+        response = requests.Response()
+        response.url = url
+        response.encoding = "utf-8"
+        response.headers["ETag"] = etag
+        if headers.get("If-None-Match") == etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = body
+        return response
+
+
+def expire(key):
+    entry = cache.store.get(key)
+    cache.store.set(key, entry._replace(fresh_until=0, stale_until=0))
+
+
+def opponent(results):
+    return results[0]["opponent"]["name"]
+
+
+def setup_function():
+    cache.store.clear()
+
+
+def test_reload_of_unchanged_page_is_revalidated(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(upstream, "session", fake)
+    fake.pages[URL] = RESULTS
+
+    assert opponent(app.get_history("4494")) == "Opp0"
+    expire(("results", "4494"))
+    assert opponent(app.get_history("4494")) == "Opp0"
+    assert "If-None-Match" in fake.requests[-1][1]
+
+
+# The page changed and was downloaded outside of the cache entry, reloading the entry
+# must not be answered 304 with the validators of that other download
+def test_reload_ignores_validators_of_other_downloads(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(upstream, "session", fake)
+    fake.pages[URL] = RESULTS
+
+    assert opponent(app.get_history("4494")) == "Opp0"
+    fake.pages[URL] = RESULTS.replace(b">Opp0<", b">CHANGED<")
+    assert opponent(history.fetch("4494", 0)) == "CHANGED"
+
+    expire(("results", "4494"))
+    assert opponent(app.get_history("4494")) == "CHANGED"